@@ -0,0 +1,321 @@
+"""Offline end-to-end benchmark of the chat -> LLM -> MCP -> Amadeus pipeline.
+
+    python -m bench.e2e [--turns 50] [--concurrency 4] [--conversation 1] [--amadeus-latency 0.05] [--llm-ttft 0.3]
+
+Starts the stand-in Amadeus (`bench.fake_amadeus`) and LLM (`bench.fake_llm`) servers and the
+real `server.py` against them, then runs `chat_by_tools` from run.py for every scenario in
+`bench/fixtures/scenarios.json`. No API keys or network are needed. With `--conversation N`,
+every N turns share one chat history, as in a real chat, so the prompt cache rate includes
+the history resent from earlier turns.
+
+Reported per metric at p50/p99 (seconds):
+
+- handshake:     tool discovery (`tool_catalog.get_all`) at the start of a turn
+- llm_ttft:      first chunk of the first model stream
+- tool:          waiting for the turn's tool calls after the model's stream ended
+                 (`SpeculativeToolCalls.results`; calls started early only count their remainder)
+- first_content: first text the user sees
+- turn:          whole `chat_by_tools` turn
+
+`--fail-over turn=2.5` exits non-zero when a p99 exceeds its budget, for CI.
+"""
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import math
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tomllib
+from pathlib import Path
+from typing import Iterator
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+METRICS = ['handshake', 'llm_ttft', 'tool', 'first_content', 'turn']
+
+_turn_metrics: contextvars.ContextVar[dict] = contextvars.ContextVar('turn_metrics')
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _toml_value(value) -> str:
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, list):
+        return '[' + ', '.join(_toml_value(v) for v in value) + ']'
+    return json.dumps(str(value))
+
+
+def dump_toml(config: dict, prefix: str = '') -> str:
+    """Enough TOML for config.toml: scalars, lists and nested tables."""
+    lines = [f'{key} = {_toml_value(value)}' for key, value in config.items() if not isinstance(value, dict)]
+    for key, value in config.items():
+        if isinstance(value, dict):
+            lines.append(f'\n[{prefix}{key}]')
+            lines.append(dump_toml(value, f'{prefix}{key}.'))
+    return '\n'.join(lines)
+
+
+def bench_config(ports: dict, amadeus_cache: bool, tool_result_cache: bool = False, tool_speculation: str = 'safe') -> dict:
+    with open(ROOT / 'config.toml', 'rb') as f:
+        config = tomllib.load(f)
+    config['openai_base_url'] = f"http://127.0.0.1:{ports['llm']}/v1"
+    config['openai_api_key'] = 'bench'
+    config['server'] = {**config.get('server', {}), 'host': '127.0.0.1', 'port': ports['mcp'], 'path': '/mcp'}
+    config['mcp'] = {**config['mcp'], 'url': f"http://127.0.0.1:{ports['mcp']}/mcp", 'tool_result_cache': tool_result_cache,
+                     'tool_speculation': tool_speculation}
+    amadeus = config.setdefault('amadeus', {})
+    amadeus.update({'base_url': f"http://127.0.0.1:{ports['amadeus']}", 'token_cache_path': '', 'cache_sqlite_path': ''})
+    if not amadeus_cache:
+        amadeus['cache_ttl'] = {endpoint: 0 for endpoint in amadeus.get('cache_ttl', {})}
+    return config
+
+
+async def wait_for_port(port: int, process: subprocess.Popen, timeout: float = 60) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f'{process.args} exited with {process.returncode}')
+        try:
+            _, writer = await asyncio.open_connection('127.0.0.1', port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise TimeoutError(f'nothing listening on port {port} after {timeout}s')
+
+
+@contextlib.contextmanager
+def services(commands: dict[str, list[str]], env: dict, log) -> Iterator[dict[str, subprocess.Popen]]:
+    """Start `commands` from the repository root and stop them on exit. On an error, the tail of
+    `log` (their shared output file, or None when they write to the console) is printed."""
+    processes = {}
+    try:
+        for name, command in commands.items():
+            processes[name] = subprocess.Popen(command, cwd=ROOT, env=env, stdout=log, stderr=log)
+        yield processes
+    except Exception:
+        if log is not None:
+            log.flush()
+            print(Path(log.name).read_text()[-4000:], file=sys.stderr)
+        raise
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                process.wait(timeout=10)
+
+
+def record(name: str, seconds: float) -> None:
+    metrics = _turn_metrics.get(None)
+    if metrics is not None and name not in metrics:
+        metrics[name] = seconds
+
+
+def instrument(run) -> None:
+    """Wrap the pieces `chat_by_tools` calls so every turn records its own phase timings."""
+    get_all = run.tool_catalog.get_all
+    tool_calls_cls = run.SpeculativeToolCalls
+    llm_stream = run.async_llm_streaming_call
+
+    async def timed_get_all(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await get_all(*args, **kwargs)
+        finally:
+            record('handshake', time.perf_counter() - start)
+
+    class TimedToolCalls(tool_calls_cls):
+        async def results(self):
+            start = time.perf_counter()
+            try:
+                return await super().results()
+            finally:
+                record('tool', time.perf_counter() - start)
+
+    async def timed_llm_stream(*args, **kwargs):
+        start = time.perf_counter()
+        async for chunk in llm_stream(*args, **kwargs):
+            record('llm_ttft', time.perf_counter() - start)
+            yield chunk
+
+    run.tool_catalog.get_all = timed_get_all
+    run.SpeculativeToolCalls = TimedToolCalls
+    run.async_llm_streaming_call = timed_llm_stream
+
+
+async def run_turn(run, message: str, history: list[dict] | None = None) -> dict:
+    metrics = {}
+    _turn_metrics.set(metrics)
+    start = time.perf_counter()
+    try:
+        async for _ in run.chat_by_tools(message, [] if history is None else history):
+            record('first_content', time.perf_counter() - start)
+    except Exception as e:
+        metrics['error'] = repr(e)
+    metrics['turn'] = time.perf_counter() - start
+    return metrics
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def summarize(results: list[dict]) -> dict:
+    summary = {}
+    for metric in METRICS:
+        values = [r[metric] for r in results if metric in r]
+        if values:
+            summary[metric] = {
+                'n': len(values),
+                'p50': percentile(values, 50),
+                'p99': percentile(values, 99),
+                'mean': statistics.fmean(values),
+            }
+    summary['errors'] = sum('error' in r for r in results)
+    return summary
+
+
+def print_summary(summary: dict, cold: dict, elapsed: float, turns: int, upstream: dict) -> None:
+    print(f"\n{'metric':<14}{'n':>5}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for metric in METRICS:
+        if metric in summary:
+            s = summary[metric]
+            print(f"{metric:<14}{s['n']:>5}{s['p50'] * 1e3:>10.1f}{s['p99'] * 1e3:>10.1f}{s['mean'] * 1e3:>10.1f}")
+    print(f"\ncold turn: {', '.join(f'{k} {v * 1e3:.1f} ms' for k, v in cold.items() if k in METRICS)}")
+    print(f'{turns} turns in {elapsed:.2f}s ({turns / elapsed:.2f} turns/s), errors: {summary["errors"]}')
+    for name, stats in upstream.items():
+        print(f'{name}: {stats}')
+    llm = upstream.get('fake llm', {})
+    if llm.get('prompt_tokens'):
+        print(f"prompt cache: {llm['cached_tokens'] / llm['prompt_tokens']:.1%} of prompt tokens cached")
+
+
+async def bench(args, ports: dict) -> int:
+    os.environ['MCP_TEST_CONFIG'] = str(args.config_path)
+    import run  # reads MCP_TEST_CONFIG at import
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    instrument(run)
+
+    with open(args.scenarios, encoding='utf-8') as f:
+        messages = [scenario['message'] for scenario in json.load(f)]
+
+    cold = await run_turn(run, messages[0])  # opens the MCP pool and loads the tool catalog
+    for i in range(args.warmup):
+        await run_turn(run, messages[i % len(messages)])
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def conversation(turns: range) -> list[dict]:
+        history = []
+        async with semaphore:
+            return [await run_turn(run, messages[i % len(messages)], history) for i in turns]
+
+    start = time.perf_counter()
+    size = max(1, args.conversation)
+    conversations = await asyncio.gather(*[
+        conversation(range(i, min(i + size, args.turns))) for i in range(0, args.turns, size)
+    ])
+    results = [result for turns in conversations for result in turns]
+    elapsed = time.perf_counter() - start
+    await run.mcp_pool.close()
+
+    upstream = {}
+    async with httpx.AsyncClient() as client:
+        for name in ('amadeus', 'llm'):
+            upstream[f'fake {name}'] = (await client.get(f'http://127.0.0.1:{ports[name]}/_stats')).json()
+
+    summary = summarize(results)
+    print_summary(summary, cold, elapsed, args.turns, upstream)
+    for result in results:
+        if 'error' in result:
+            print(f"error: {result['error']}")
+            break
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'summary': summary, 'cold': cold, 'elapsed': elapsed, 'upstream': upstream, 'args': {
+                k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()
+            }}, f, indent=2)
+
+    failed = summary['errors'] > 0
+    for budget in args.fail_over:
+        metric, _, seconds = budget.partition('=')
+        p99 = summary.get(metric, {}).get('p99')
+        if p99 is not None and p99 > float(seconds):
+            print(f'FAIL: {metric} p99 {p99 * 1e3:.1f} ms > {float(seconds) * 1e3:.1f} ms')
+            failed = True
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--turns', type=int, default=50)
+    parser.add_argument('--concurrency', type=int, default=4, help='chats running at the same time')
+    parser.add_argument('--conversation', type=int, default=1, help='turns per chat history')
+    parser.add_argument('--warmup', type=int, default=2, help='turns run after the cold turn and not measured')
+    parser.add_argument('--scenarios', type=Path, default=ROOT / 'bench' / 'fixtures' / 'scenarios.json')
+    parser.add_argument('--amadeus-latency', type=float, default=0.05)
+    parser.add_argument('--amadeus-jitter', type=float, default=0.02)
+    parser.add_argument('--amadeus-cache', action='store_true', help="keep server.py's response cache on")
+    parser.add_argument('--tool-result-cache', action='store_true', help="enable the chat's tool-result cache")
+    parser.add_argument('--tool-speculation', choices=['safe', 'all', 'off'], default='safe',
+                        help='start tool calls while the model still streams')
+    parser.add_argument('--llm-ttft', type=float, default=0.3)
+    parser.add_argument('--llm-token-delay', type=float, default=0.01)
+    parser.add_argument('--llm-cached-ttft-discount', type=float, default=0.0,
+                        help='share of the stand-in ttft saved when the whole prompt is a prompt-cache hit')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--fail-over', action='append', default=[], metavar='METRIC=SECONDS',
+                        help='exit 1 if the p99 of METRIC exceeds SECONDS; repeatable')
+    parser.add_argument('--verbose', action='store_true', help='keep INFO logs of run.py and the services')
+    args = parser.parse_args()
+
+    ports = {'amadeus': free_port(), 'llm': free_port(), 'mcp': free_port()}
+    with tempfile.TemporaryDirectory(prefix='mcp-bench-') as tmp:
+        args.config_path = Path(tmp) / 'config.toml'
+        args.config_path.write_text(dump_toml(bench_config(ports, args.amadeus_cache, args.tool_result_cache, args.tool_speculation)))
+        env = {**os.environ, 'MCP_TEST_CONFIG': str(args.config_path), 'PYTHONPATH': str(ROOT)}
+        log = None if args.verbose else open(Path(tmp) / 'services.log', 'w')
+        commands = {
+            'amadeus': [sys.executable, '-m', 'bench.fake_amadeus', '--port', str(ports['amadeus']),
+                        '--latency', str(args.amadeus_latency), '--jitter', str(args.amadeus_jitter)],
+            'llm': [sys.executable, '-m', 'bench.fake_llm', '--port', str(ports['llm']), '--scenarios', str(args.scenarios),
+                    '--ttft', str(args.llm_ttft), '--token-delay', str(args.llm_token_delay),
+                    '--cached-ttft-discount', str(args.llm_cached_ttft_discount)],
+            'mcp': [sys.executable, 'server.py'],
+        }
+        try:
+            with services(commands, env, log) as processes:
+                async def start_and_bench():
+                    for name, process in processes.items():
+                        await wait_for_port(ports[name], process)
+                    return await bench(args, ports)
+
+                code = asyncio.run(start_and_bench())
+        finally:
+            if log is not None:
+                log.close()
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
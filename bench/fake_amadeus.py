@@ -0,0 +1,76 @@
+"""Stand-in for the Amadeus self-service API that replays recorded responses.
+
+    python -m bench.fake_amadeus [--port 8701] [--latency 0.05] [--jitter 0.02]
+
+Every GET is answered with `<fixtures>/<last path segment>.json`, e.g.
+`/v2/shopping/flight-offers` -> `flight-offers.json`, after `latency` seconds plus up to
+`jitter` seconds. The OAuth token endpoint always issues a token. Point `[amadeus] base_url`
+at this server to run server.py without API keys or network.
+"""
+import argparse
+import asyncio
+import itertools
+import random
+from pathlib import Path
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+FIXTURES = Path(__file__).parent / 'fixtures' / 'amadeus'
+
+
+def create_app(fixtures: Path = FIXTURES, latency: float = 0.05, jitter: float = 0.02) -> Starlette:
+    # bytes as recorded, so replay costs the same regardless of size
+    recorded = {path.stem: path.read_bytes() for path in Path(fixtures).glob('*.json')}
+    tokens = itertools.count(1)
+    stats = {'requests': 0, 'tokens': 0}
+
+    async def delay():
+        await asyncio.sleep(latency + random.uniform(0, jitter))
+
+    async def token(request: Request):
+        await delay()
+        stats['tokens'] += 1
+        return JSONResponse({
+            'type': 'amadeusOAuth2Token',
+            'access_token': f'fake-token-{next(tokens)}',
+            'token_type': 'Bearer',
+            'expires_in': 1799,
+            'state': 'approved',
+        })
+
+    async def replay(request: Request):
+        await delay()
+        stats['requests'] += 1
+        body = recorded.get(request.url.path.rstrip('/').rsplit('/', 1)[-1])
+        if body is None:
+            return JSONResponse({'errors': [{'status': 404, 'title': 'NOT FOUND', 'detail': request.url.path}]}, 404)
+        return Response(body, media_type='application/vnd.amadeus+json')
+
+    async def get_stats(request: Request):
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route('/v1/security/oauth2/token', token, methods=['POST']),
+        Route('/_stats', get_stats),
+        Route('/{path:path}', replay),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8701)
+    parser.add_argument('--fixtures', type=Path, default=FIXTURES)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.02, help='random extra seconds, uniform in [0, jitter]')
+    args = parser.parse_args()
+    app = create_app(args.fixtures, args.latency, args.jitter)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
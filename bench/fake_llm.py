@@ -0,0 +1,176 @@
+"""Stand-in for an OpenAI-compatible chat completions endpoint with scripted streams.
+
+    python -m bench.fake_llm [--port 8702] [--ttft 0.3] [--token-delay 0.01]
+
+Replies follow `bench/fixtures/scenarios.json`. The scenario is picked by the start of the
+last user message (the client appends a `<context>` block to it):
+
+- if the conversation ends with a tool result, or the scenario has no tool calls, the
+  scenario's `answer` is streamed as content deltas;
+- otherwise the scenario's `tool_calls` are streamed as tool-call deltas, with the
+  arguments split into small pieces the way real models emit them.
+
+The first chunk is sent after `ttft` seconds and every further chunk after `token_delay`.
+
+Prompt caching is simulated the way providers do it: a request's prefix (tools, then each
+message, ignoring `cache_control` markers) is cached once sent, and the usage chunk
+(`stream_options.include_usage`) reports the longest previously seen prefix as
+`cached_tokens`. `--cached-ttft-discount 0.5` makes a fully cached prompt start twice as fast.
+"""
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import time
+from pathlib import Path
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+SCENARIOS = Path(__file__).parent / 'fixtures' / 'scenarios.json'
+
+
+def load_scenarios(path: Path = SCENARIOS) -> list[dict]:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _pieces(text: str, size: int) -> list[str]:
+    return [text[i:i + size] for i in range(0, len(text), size)] or ['']
+
+
+def create_app(
+    scenarios: list[dict],
+    ttft: float = 0.3,
+    token_delay: float = 0.01,
+    chunk_chars: int = 4,
+    cached_ttft_discount: float = 0.0,
+) -> Starlette:
+    by_message = {scenario['message']: scenario for scenario in scenarios}
+    ids = itertools.count(1)
+    stats = {'requests': 0, 'tool_call_streams': 0, 'content_streams': 0, 'prompt_tokens': 0, 'cached_tokens': 0}
+    cached_prefixes: set[str] = set()
+
+    def chunk(completion_id: str, model: str, delta: dict | None, finish_reason: str | None = None, usage: dict | None = None) -> str:
+        body = {
+            'id': completion_id,
+            'object': 'chat.completion.chunk',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [] if delta is None else [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}],
+        }
+        if usage is not None:
+            body['usage'] = usage
+        return f'data: {json.dumps(body, ensure_ascii=False)}\n\n'
+
+    def strip_cache_control(value):
+        if isinstance(value, dict):
+            return {k: strip_cache_control(v) for k, v in value.items() if k != 'cache_control'}
+        if isinstance(value, list):
+            return [strip_cache_control(v) for v in value]
+        return value
+
+    def prompt_usage(request: dict) -> tuple[int, int]:
+        """(prompt tokens, tokens of the longest prefix sent before), at ~4 characters a token."""
+        blocks = [json.dumps(request.get('tools'), ensure_ascii=False)]
+        blocks += [json.dumps(strip_cache_control(m), ensure_ascii=False) for m in request.get('messages', [])]
+        digest, length, cached = hashlib.sha256(), 0, 0
+        for block in blocks:
+            digest.update(block.encode())
+            length += len(block)
+            key = digest.hexdigest()
+            if key in cached_prefixes:
+                cached = length
+            cached_prefixes.add(key)
+        return length // 4, cached // 4
+
+    def script(request: dict) -> tuple[list[dict], str]:
+        """Deltas to stream and the finish reason."""
+        messages = request.get('messages', [])
+        last_user = next((m.get('content') for m in reversed(messages) if m.get('role') == 'user'), '') or ''
+        if isinstance(last_user, list):
+            last_user = ''.join(part.get('text', '') for part in last_user)
+        scenario = next((s for message, s in by_message.items() if last_user.startswith(message)), None) \
+            or {'answer': f'(no scenario for {last_user!r})'}
+        if messages and messages[-1].get('role') != 'tool' and scenario.get('tool_calls') and request.get('tools'):
+            stats['tool_call_streams'] += 1
+            deltas = []
+            for index, call in enumerate(scenario['tool_calls']):
+                deltas.append({'tool_calls': [{
+                    'index': index,
+                    'id': f'call_{next(ids)}',
+                    'type': 'function',
+                    'function': {'name': call['name'], 'arguments': ''},
+                }]})
+                arguments = json.dumps(call['arguments'], ensure_ascii=False)
+                deltas.extend(
+                    {'tool_calls': [{'index': index, 'function': {'arguments': piece}}]}
+                    for piece in _pieces(arguments, chunk_chars * 2)
+                )
+            return deltas, 'tool_calls'
+        stats['content_streams'] += 1
+        return [{'content': piece} for piece in _pieces(scenario.get('answer', ''), chunk_chars)], 'stop'
+
+    async def completions(request: Request):
+        body = await request.json()
+        stats['requests'] += 1
+        deltas, finish_reason = script(body)
+        completion_id = f'chatcmpl-{next(ids)}'
+        model = body.get('model', 'fake')
+        prompt_tokens, cached_tokens = prompt_usage(body)
+        stats['prompt_tokens'] += prompt_tokens
+        stats['cached_tokens'] += cached_tokens
+
+        async def stream():
+            await asyncio.sleep(ttft * (1 - cached_ttft_discount * cached_tokens / max(1, prompt_tokens)))
+            yield chunk(completion_id, model, {'role': 'assistant', **deltas[0]})
+            for delta in deltas[1:]:
+                await asyncio.sleep(token_delay)
+                yield chunk(completion_id, model, delta)
+            yield chunk(completion_id, model, {}, finish_reason)
+            if (body.get('stream_options') or {}).get('include_usage'):
+                completion_tokens = sum(len(json.dumps(d, ensure_ascii=False)) for d in deltas) // 4
+                yield chunk(completion_id, model, None, usage={
+                    'prompt_tokens': prompt_tokens,
+                    'completion_tokens': completion_tokens,
+                    'total_tokens': prompt_tokens + completion_tokens,
+                    'prompt_tokens_details': {'cached_tokens': cached_tokens},
+                })
+            yield 'data: [DONE]\n\n'
+
+        if not body.get('stream'):
+            return JSONResponse({'error': {'message': 'only stream=true is scripted'}}, 400)
+        return StreamingResponse(stream(), media_type='text/event-stream')
+
+    async def get_stats(request: Request):
+        return JSONResponse(stats)
+
+    return Starlette(routes=[
+        Route('/v1/chat/completions', completions, methods=['POST']),
+        Route('/chat/completions', completions, methods=['POST']),
+        Route('/_stats', get_stats),
+    ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8702)
+    parser.add_argument('--scenarios', type=Path, default=SCENARIOS)
+    parser.add_argument('--ttft', type=float, default=0.3, help='seconds before the first chunk')
+    parser.add_argument('--token-delay', type=float, default=0.01, help='seconds between chunks')
+    parser.add_argument('--chunk-chars', type=int, default=4, help='content characters per chunk')
+    parser.add_argument('--cached-ttft-discount', type=float, default=0.0,
+                        help='share of ttft saved when the whole prompt is a cache hit')
+    args = parser.parse_args()
+    app = create_app(load_scenarios(args.scenarios), args.ttft, args.token_delay, args.chunk_chars,
+                     args.cached_ttft_discount)
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
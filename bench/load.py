@@ -0,0 +1,248 @@
+"""Concurrent-session load test of the MCP server.
+
+    python -m bench.load [--sessions 32] [--ramp-up 10] [--duration 30] [--workers 1]
+    python -m bench.load --url http://127.0.0.1:8000/mcp   # a server that is already running
+
+Opens up to `--sessions` MCP sessions, one more every `ramp-up / sessions` seconds. Each
+session calls tools back to back (after an exponential `--think-time`, if given), picked at
+random by the weights of the profile (`bench/fixtures/load_profile.json`: tool name ->
+`weight` and a list of `arguments`). Unless `--url` is given, the stand-in Amadeus
+(`bench.fake_amadeus`) and the real `server.py` are started against it as in `bench.e2e`,
+so no API keys or network are needed.
+
+Reported:
+
+- per `--interval` seconds: sessions open, calls/s, p50/p95 latency and errors, to see where
+  latency starts to climb while the load ramps up;
+- per tool and overall, over the steady phase after the ramp-up: successful calls/s,
+  p50/p95/p99 latency and error rate, plus the most common errors.
+
+The generator is one asyncio process; if it saturates a core before the server does, run
+several against the same `--url`. `--fail-over all=1.5` (p99 seconds, per tool or `all`) and
+`--max-error-rate 0.01` exit non-zero, for CI.
+"""
+import argparse
+import asyncio
+import collections
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+from fastmcp import Client
+
+from bench.e2e import ROOT, bench_config, dump_toml, free_port, percentile, services, wait_for_port
+
+PROFILE = ROOT / 'bench' / 'fixtures' / 'load_profile.json'
+
+
+def load_profile(path: Path = PROFILE) -> dict[str, dict]:
+    with open(path, encoding='utf-8') as f:
+        profile = json.load(f)
+    for tool, entry in profile.items():
+        if not entry.get('arguments'):
+            raise ValueError(f'profile entry {tool} has no arguments')
+    return profile
+
+
+class Call:
+    __slots__ = ('start', 'seconds', 'tool', 'error')
+
+    def __init__(self, start: float, seconds: float, tool: str, error: str | None):
+        self.start = start
+        self.seconds = seconds
+        self.tool = tool
+        self.error = error
+
+
+async def session(
+    url: str, profile: dict, rng: random.Random, start_at: float, stop_at: float, think_time: float, calls: list[Call]
+) -> None:
+    """One MCP session calling tools from `start_at` until `stop_at` (perf_counter times)."""
+    tools = list(profile)
+    weights = [profile[tool].get('weight', 1) for tool in tools]
+    await asyncio.sleep(max(0.0, start_at - time.perf_counter()))
+    opened = time.perf_counter()
+    try:
+        async with Client(url) as client:
+            while time.perf_counter() < stop_at:
+                tool = rng.choices(tools, weights)[0]
+                arguments = rng.choice(profile[tool]['arguments'])
+                start, error = time.perf_counter(), None
+                try:
+                    await client.call_tool(tool, arguments)
+                except Exception as e:
+                    error = f'{type(e).__name__}: {e}'
+                calls.append(Call(start, time.perf_counter() - start, tool, error))
+                if think_time > 0:
+                    await asyncio.sleep(rng.expovariate(1 / think_time))
+    except Exception as e:
+        # the session could not be opened, or broke outside a call
+        calls.append(Call(opened, time.perf_counter() - opened, 'session', f'{type(e).__name__}: {e}'))
+
+
+def summarize(calls: list[Call], seconds: float) -> dict:
+    ok = [c.seconds for c in calls if c.error is None]
+    errors = len(calls) - len(ok)
+    summary = {
+        'calls': len(calls),
+        'throughput': len(ok) / seconds if seconds > 0 else 0.0,
+        'errors': errors,
+        'error_rate': errors / len(calls) if calls else 0.0,
+    }
+    if ok:
+        summary.update({
+            'p50': percentile(ok, 50), 'p95': percentile(ok, 95), 'p99': percentile(ok, 99),
+            'mean': statistics.fmean(ok),
+        })
+    return summary
+
+
+def timeline(calls: list[Call], begin: float, end: float, interval: float, session_starts: list[float]) -> list[dict]:
+    steps = []
+    step_start = begin
+    while step_start < end:
+        step_end = min(end, step_start + interval)
+        in_step = [c for c in calls if step_start <= c.start < step_end]
+        steps.append({
+            'at': step_end - begin,
+            'sessions': sum(s <= step_end for s in session_starts),
+            **summarize(in_step, step_end - step_start),
+        })
+        step_start = step_end
+    return steps
+
+
+def _ms(summary: dict, key: str) -> str:
+    return f"{summary[key] * 1e3:>9.1f}" if key in summary else f"{'-':>9}"
+
+
+def print_report(steps: list[dict], by_tool: dict[str, dict], overall: dict, errors: collections.Counter, upstream: dict) -> None:
+    print(f"\n{'t s':>6}{'sessions':>10}{'calls/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'errors':>8}")
+    for step in steps:
+        print(f"{step['at']:>6.1f}{step['sessions']:>10}{step['throughput']:>9.1f}"
+              f"{_ms(step, 'p50')}{_ms(step, 'p95')}{step['errors']:>8}")
+    print(f"\nsteady phase\n{'tool':<24}{'calls':>7}{'ok/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}")
+    for tool, s in [*by_tool.items(), ('all', overall)]:
+        print(f"{tool:<24}{s['calls']:>7}{s['throughput']:>8.1f}{_ms(s, 'p50')}{_ms(s, 'p95')}{_ms(s, 'p99')}"
+              f"{s['error_rate']:>8.1%}")
+    for message, count in errors.most_common(5):
+        print(f'error x{count}: {message[:200]}')
+    for name, stats in upstream.items():
+        print(f'{name}: {stats}')
+
+
+async def load(args, url: str, upstream_stats: str | None = None) -> int:
+    profile = load_profile(args.profile)
+    calls: list[Call] = []
+    begin = time.perf_counter()
+    step = args.ramp_up / args.sessions if args.sessions > 1 else 0.0
+    session_starts = [begin + i * step for i in range(args.sessions)]
+    steady_from = begin + args.ramp_up
+    stop_at = steady_from + args.duration
+    await asyncio.gather(*[
+        session(url, profile, random.Random(args.seed + i), start_at, stop_at, args.think_time, calls)
+        for i, start_at in enumerate(session_starts)
+    ])
+    end = time.perf_counter()
+
+    steady = [c for c in calls if c.start >= steady_from]
+    by_tool = {tool: summarize([c for c in steady if c.tool == tool], args.duration)
+               for tool in sorted({c.tool for c in steady})}
+    overall = summarize(steady, args.duration)
+    steps = timeline(calls, begin, end, args.interval, session_starts)
+    errors = collections.Counter(c.error for c in calls if c.error is not None)
+    upstream = {}
+    if upstream_stats:
+        async with httpx.AsyncClient() as client:
+            upstream['fake amadeus'] = (await client.get(upstream_stats)).json()
+    print_report(steps, by_tool, overall, errors, upstream)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'steady': overall, 'tools': by_tool, 'timeline': steps, 'errors': dict(errors),
+                       'upstream': upstream, 'args': {k: str(v) if isinstance(v, Path) else v
+                                                      for k, v in vars(args).items()}}, f, indent=2)
+
+    failed = False
+    if overall['calls'] == 0:
+        print('FAIL: no calls in the steady phase')
+        failed = True
+    if overall['error_rate'] > args.max_error_rate:
+        print(f"FAIL: error rate {overall['error_rate']:.1%} > {args.max_error_rate:.1%}")
+        failed = True
+    for budget in args.fail_over:
+        tool, _, seconds = budget.partition('=')
+        p99 = (overall if tool == 'all' else by_tool.get(tool, {})).get('p99')
+        if p99 is not None and p99 > float(seconds):
+            print(f'FAIL: {tool} p99 {p99 * 1e3:.1f} ms > {float(seconds) * 1e3:.1f} ms')
+            failed = True
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sessions', type=int, default=32, help='concurrent MCP sessions at full load')
+    parser.add_argument('--ramp-up', type=float, default=10, help='seconds over which sessions are opened')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of full load after the ramp-up')
+    parser.add_argument('--think-time', type=float, default=0, help='mean seconds a session waits between calls')
+    parser.add_argument('--interval', type=float, default=2, help='seconds per timeline step')
+    parser.add_argument('--profile', type=Path, default=PROFILE)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--url', help='MCP endpoint of a running server; nothing is started')
+    parser.add_argument('--workers', type=int, default=1, help="server.py worker processes")
+    parser.add_argument('--amadeus-latency', type=float, default=0.05)
+    parser.add_argument('--amadeus-jitter', type=float, default=0.02)
+    parser.add_argument('--amadeus-cache', action='store_true', help="keep server.py's response cache on")
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--max-error-rate', type=float, default=0.0, help='exit 1 above this steady-phase error rate')
+    parser.add_argument('--fail-over', action='append', default=[], metavar='TOOL=SECONDS',
+                        help='exit 1 if the p99 of TOOL (or `all`) exceeds SECONDS; repeatable')
+    parser.add_argument('--verbose', action='store_true', help='keep INFO logs of the services')
+    args = parser.parse_args()
+    args.sessions = max(1, args.sessions)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+
+    if args.url:
+        sys.exit(asyncio.run(load(args, args.url)))
+
+    ports = {'amadeus': free_port(), 'llm': free_port(), 'mcp': free_port()}
+    with tempfile.TemporaryDirectory(prefix='mcp-load-') as tmp:
+        config = bench_config(ports, args.amadeus_cache)
+        config['server']['workers'] = args.workers
+        # workers share the token, response cache and rate limit through these files
+        config['amadeus']['token_cache_path'] = str(Path(tmp) / 'amadeus_token.json')
+        config['amadeus']['cache_sqlite_path'] = str(Path(tmp) / 'amadeus_cache.sqlite3')
+        config['amadeus']['rate_limit_path'] = str(Path(tmp) / 'amadeus_rate_limit.json')
+        config_path = Path(tmp) / 'config.toml'
+        config_path.write_text(dump_toml(config))
+        env = {**os.environ, 'MCP_TEST_CONFIG': str(config_path), 'PYTHONPATH': str(ROOT)}
+        log = None if args.verbose else open(Path(tmp) / 'services.log', 'w')
+        commands = {
+            'amadeus': [sys.executable, '-m', 'bench.fake_amadeus', '--port', str(ports['amadeus']),
+                        '--latency', str(args.amadeus_latency), '--jitter', str(args.amadeus_jitter)],
+            'mcp': [sys.executable, 'server.py'],
+        }
+        try:
+            with services(commands, env, log) as processes:
+                async def start_and_load():
+                    for name, process in processes.items():
+                        await wait_for_port(ports[name], process)
+                    return await load(args, f"http://127.0.0.1:{ports['mcp']}/mcp",
+                                      f"http://127.0.0.1:{ports['amadeus']}/_stats")
+
+                code = asyncio.run(start_and_load())
+        finally:
+            if log is not None:
+                log.close()
+    sys.exit(code)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Microbenchmark for `ensure_strict_json_schema` on deep and wide schemas.
+
+    python -m bench.strict_schema [--sizes 10 50 200 400] [--repeat 200]
+
+For every shape and size it reports the cold conversion (cache cleared before each call),
+the warm call (content-hash hit) and the cold cost per schema node, which should stay flat
+as schemas grow. It also checks that the input schema is left untouched.
+"""
+import argparse
+import json
+import time
+
+from src.strict_schema import clear_strict_schema_cache, ensure_strict_json_schema
+
+
+def wide_schema(n: int) -> dict:
+    """`n` properties, a third of them `$ref`s with a description into shared `$defs`."""
+    properties = {}
+    for i in range(n):
+        if i % 3 == 0:
+            properties[f'p{i}'] = {'$ref': f'#/$defs/D{i % 10}', 'description': f'field {i}'}
+        elif i % 3 == 1:
+            properties[f'p{i}'] = {'anyOf': [{'type': 'string'}, {'type': 'null'}], 'default': None}
+        else:
+            properties[f'p{i}'] = {'type': 'array', 'items': {'type': 'integer'}}
+    defs = {
+        f'D{j}': {'type': 'object', 'properties': {'code': {'type': 'string'}, 'value': {'type': 'number'}}}
+        for j in range(10)
+    }
+    return {'type': 'object', 'properties': properties, '$defs': defs}
+
+
+def deep_schema(n: int) -> dict:
+    """Objects nested `n` levels deep, each level with a sibling scalar and array."""
+    schema = {'type': 'object', 'properties': {'leaf': {'type': 'string'}}}
+    for i in range(n):
+        schema = {
+            'type': 'object',
+            'properties': {
+                'child': schema,
+                f'name{i}': {'type': 'string'},
+                f'tags{i}': {'type': 'array', 'items': {'type': 'string'}},
+            },
+        }
+    return schema
+
+
+def count_nodes(schema) -> int:
+    nodes, stack = 0, [schema]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            nodes += 1
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return nodes
+
+
+def timeit(fn, repeat: int) -> float:
+    """Best-of-three mean seconds per call."""
+    best = float('inf')
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def cold(schema):
+    clear_strict_schema_cache()
+    ensure_strict_json_schema(schema)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 50, 200, 400])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'shape':<6}{'size':>6}{'nodes':>8}{'cold us':>12}{'warm us':>10}{'cold ns/node':>14}  input unchanged")
+    for shape, build in (('wide', wide_schema), ('deep', deep_schema)):
+        for size in args.sizes:
+            schema = build(size)
+            original = json.dumps(schema, sort_keys=True)
+            nodes = count_nodes(schema)
+            repeat = max(5, args.repeat * 10 // size)
+            cold_s = timeit(lambda: cold(schema), repeat)
+            ensure_strict_json_schema(schema)
+            warm_s = timeit(lambda: ensure_strict_json_schema(schema), repeat)
+            unchanged = json.dumps(schema, sort_keys=True) == original
+            print(
+                f'{shape:<6}{size:>6}{nodes:>8}{cold_s * 1e6:>12.1f}{warm_s * 1e6:>10.1f}'
+                f'{cold_s / nodes * 1e9:>14.0f}  {unchanged}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -1,130 +1,463 @@
+import asyncio
+import csv
+import hashlib
+import io
 import os
-import datetime
-import requests
+import httpx
 import json
 import logging
 from typing import Optional, Annotated
 from pydantic import Field
+from mcp_tool.token_manager import AccessTokenManager
+from mcp_tool.response_cache import MISSING, ResponseCache
+from mcp_tool.single_flight import SingleFlight
+from mcp_tool.rate_limit import RETRY_STATUS, SharedTokenBucket, TokenBucket, backoff_delay, parse_retry_after
+from mcp_tool.json_stream import JsonObjectStream
+from src.tracing import span
 logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s',datefmt = '%m/%d/%Y %I:%M:%S %p', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+try:
+    import h2  # noqa: F401  # enables httpx HTTP/2 support
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+def _cell(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return str(value)
+
+def _encode_delimited(rows: list[list], columns: list[str], meta: dict, delimiter: str) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=delimiter, lineterminator='\n')
+    writer.writerow(columns)
+    writer.writerows([[_cell(v) for v in row] for row in rows])
+    if meta:
+        buffer.write(', '.join(f'{k}: {v}' for k, v in meta.items()))
+    return buffer.getvalue().rstrip('\n')
+
+def _encode_json(rows: list[list], columns: list[str], meta: dict) -> str:
+    # column-major header + rows instead of repeating every key per row
+    result = {'columns': columns, 'rows': rows, **({'meta': meta} if meta else {})}
+    return json.dumps(result, ensure_ascii=False, separators=(',', ':'), default=str)
+
+def _encode_markdown(rows: list[list], columns: list[str], meta: dict) -> str:
+    def line(cells):
+        return '|' + '|'.join(_cell(c).replace('|', '\\|').replace('\n', ' ') for c in cells) + '|'
+    lines = [line(columns), '|' + '|'.join('-' * 3 for _ in columns) + '|']
+    lines += [line(row) for row in rows]
+    if meta:
+        lines.append(', '.join(f'{k}: {v}' for k, v in meta.items()))
+    return '\n'.join(lines)
+
+RESULT_ENCODERS = {
+    'json': _encode_json,
+    'csv': lambda rows, columns, meta: _encode_delimited(rows, columns, meta, ','),
+    'tsv': lambda rows, columns, meta: _encode_delimited(rows, columns, meta, '\t'),
+    'markdown': _encode_markdown,
+}
+
+def encode_result(
+    records: list[dict],
+    fmt: str = 'csv',
+    columns: list[str] | None = None,
+    meta: dict | None = None,
+) -> str:
+    """Encode tool records as one compact table.
+
+    Args:
+        records: one flat dict per row.
+        fmt: one of `RESULT_ENCODERS` (json, csv, tsv, markdown).
+        columns: columns to keep, in order. Defaults to every key of the records.
+        meta: summary values (counts, currency, errors) written after the table.
+    """
+    if columns is None:
+        columns = list(dict.fromkeys(key for record in records for key in record))
+    rows = [[record.get(column) for column in columns] for record in records]
+    return RESULT_ENCODERS[fmt](rows, columns, meta or {})
+
+def encoded_sizes(records: list[dict], columns: list[str] | None = None, meta: dict | None = None) -> dict[str, int]:
+    """Length in characters of the same result in every format, to pick the cheapest one."""
+    return {fmt: len(encode_result(records, fmt, columns, meta)) for fmt in RESULT_ENCODERS}
+
 class amadeus_tools:
-    def __init__(self):
+    # seconds; reference data changes rarely, offers are only good for a few minutes
+    DEFAULT_CACHE_TTL = {
+        'airplan_by_schedule': 300,
+        'airplan_by_origin': 900,
+        'hotel_by_city': 86400,
+        'hotel_offers': 300,
+    }
+    HOTEL_BY_CITY_FIELDS = ['hotelId', 'name', 'distance']
+    # result format per tool, see RESULT_ENCODERS
+    DEFAULT_OUTPUT_FORMAT = {
+        'search_fligiht': 'csv',
+        'search_flight_by_origin': 'csv',
+        'list_hotel_by_city': 'csv',
+        'search_hotel_offer': 'csv',
+    }
+    # requests per second; the test environment allows one request every 100ms
+    DEFAULT_RATE_LIMIT = {
+        'airplan_by_schedule': 10,
+        'airplan_by_origin': 10,
+        'hotel_by_city': 10,
+        'hotel_offers': 10,
+    }
+
+    def __init__(
+        self,
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30,
+        timeout: float = 30,
+        http2: bool = True,
+        token_refresh_margin: float = 120,
+        token_cache_path: str | None = None,
+        cache_max_entries: int = 512,
+        cache_sqlite_path: str | None = None,
+        cache_ttl: dict[str, float] | None = None,
+        rate_limit: dict[str, float] | None = None,
+        rate_limit_burst: float = 1,
+        rate_limit_path: str | None = None,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        max_retry_backoff: float = 8,
+        hotel_offer_chunk_size: int = 20,
+        hotel_offer_chunk_retries: int = 1,
+        output_format: dict[str, str] | None = None,
+        output_columns: dict[str, list[str]] | None = None,
+        log_encoded_sizes: bool = False,
+        base_url: str = 'https://test.api.amadeus.com',
+    ):
         self.secret_key = os.environ.get('AMADEUS_SECRET_KEY')
         self.api_key = os.environ.get('AMADEUS_API_KEY')
-        self.get_token_url = 'https://test.api.amadeus.com/v1/security/oauth2/token'
-        self.access_token = ''
-        self.access_token_time = datetime.datetime(1970,1,1)
-        self.expires_in = 0
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(timeout)
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._client: httpx.AsyncClient | None = None
+        base_url = base_url.rstrip('/')
+        self.get_token_url = f'{base_url}/v1/security/oauth2/token'
+        self.token = AccessTokenManager(
+            self.__get_access_token,
+            refresh_margin=token_refresh_margin,
+            cache_path=token_cache_path,
+            # a cached token belongs to one API key and host
+            fingerprint=hashlib.sha256(f'{self.api_key}@{base_url}'.encode()).hexdigest()[:16],
+        )
         self.url = {
-            'airplan_by_schedule': "https://test.api.amadeus.com/v2/shopping/flight-offers",
-            'airplan_by_origin': "https://test.api.amadeus.com/v1/shopping/flight-destinations",
-            'hotel_by_city': "https://test.api.amadeus.com/v1/reference-data/locations/hotels/by-city",
-            'hotel_offers': "https://test.api.amadeus.com/v3/shopping/hotel-offers",
+            'airplan_by_schedule': f"{base_url}/v2/shopping/flight-offers",
+            'airplan_by_origin': f"{base_url}/v1/shopping/flight-destinations",
+            'hotel_by_city': f"{base_url}/v1/reference-data/locations/hotels/by-city",
+            'hotel_offers': f"{base_url}/v3/shopping/hotel-offers",
         }
+        self.cache = ResponseCache(
+            max_entries=cache_max_entries,
+            sqlite_path=cache_sqlite_path or None,
+            ttls={**self.DEFAULT_CACHE_TTL, **(cache_ttl or {})},
+        )
+        self.inflight = SingleFlight()
+        rate_limit = {**self.DEFAULT_RATE_LIMIT, **(rate_limit or {})}
+        # with `rate_limit_path`, every process using the file shares one quota per endpoint
+        self.rate_limiters = {
+            endpoint: SharedTokenBucket(rate_limit.get(endpoint, 0), rate_limit_burst, rate_limit_path, endpoint)
+            if rate_limit_path else TokenBucket(rate_limit.get(endpoint, 0), rate_limit_burst)
+            for endpoint in self.url
+        }
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.hotel_offer_chunk_size = max(1, hotel_offer_chunk_size)
+        self.hotel_offer_chunk_retries = hotel_offer_chunk_retries
+        self.output_format = {**self.DEFAULT_OUTPUT_FORMAT, **(output_format or {})}
+        self.output_columns = output_columns or {}
+        self.log_encoded_sizes = log_encoded_sizes
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared keep-alive client, created on first use inside the server's event loop."""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+        return self._client
 
-    def __get_access_token(self):
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __get_access_token(self) -> dict:
         headers = {'Content-Type': 'application/x-www-form-urlencoded'}
         data = {
             'grant_type':'client_credentials',
             'client_id': self.api_key, 
             'client_secret': self.secret_key,
         }
-        response = requests.post(
-            url=self.get_token_url,
-            headers=headers, 
-            data=data
-        )
         try:
-            json_parsed = json.loads(response.text)
-            self.access_token = json_parsed['access_token']
-            self.expires_in = json_parsed['expires_in']
-            self.access_token_time = datetime.datetime.now()
+            with span('amadeus.token_refresh'):
+                response = await self.client.post(
+                    url=self.get_token_url,
+                    headers=headers, 
+                    data=data
+                )
+                json_parsed = response.json()
+            if 'access_token' not in json_parsed:
+                raise ValueError(f'no access_token in token response: {json_parsed}')
+            return json_parsed
         except BaseException as e:
             logger.error(f'Fail getting acess token: {e}')
+            raise
     
-    def __check_access_token(self):
-        if self.access_token == '' or \
-            datetime.datetime.now() - self.access_token_time > datetime.timedelta(seconds=self.expires_in):
-            self.__get_access_token()
-    
-    def __request_api(self, url:str, args:dict) -> requests.Response:
+    async def __request_api(self, url:str, args:dict, use_cache: bool = True, stream_parser=None):
+        """GET an Amadeus endpoint and return the parsed JSON body.
+
+        Successful responses are cached per endpoint (see `DEFAULT_CACHE_TTL`), and concurrent
+        calls with the same endpoint and params share one upstream request. `use_cache=False`
+        (a tool's `refresh` argument) skips both and always sends its own request; its response
+        still replaces the cached one.
+
+        `stream_parser(response, params)` consumes a successful response body incrementally
+        instead of decoding it whole; its result is what gets cached and returned.
+        """
         if 'self' in args:
             args.pop('self')
         params = {key: args[key] for key in args if args[key] and args[key] != 'None' and callable(args[key]) == False}
         logger.info(f'param : {params}')
-        self.__check_access_token()
-        headers = {
-            "Authorization": f"Bearer {self.access_token}"
-        }
-        response = requests.get(
-            url=url,
-            headers=headers,
-            params=params,
+        endpoint = next((name for name, endpoint_url in self.url.items() if endpoint_url == url), url)
+        cache_key = self.cache.make_key(
+            endpoint, params if stream_parser is None else {**params, '__parser': stream_parser.__name__}
+        )
+        if not use_cache:
+            return await self.__fetch(url, endpoint, cache_key, params, stream_parser)
+        cached = await self.cache.get(endpoint, cache_key)
+        if cached is not MISSING:
+            logger.info(f'cache hit: {endpoint}')
+            return cached
+        return await self.inflight.do(cache_key, lambda: self.__fetch(url, endpoint, cache_key, params, stream_parser))
+
+    async def __fetch(self, url: str, endpoint: str, cache_key: str, params: dict, stream_parser=None):
+        """One upstream request; identical concurrent requests share it through `self.inflight`.
+
+        Requests wait for the endpoint's rate limiter, and 429s, 5xx provider errors and
+        transport errors are retried with jittered exponential backoff that honors
+        `Retry-After`. A 401 forces a token refresh and is retried once.
+        """
+        limiter = self.rate_limiters.get(endpoint) or TokenBucket(0)
+        attempt, reauthorized = 0, False
+        while True:
+            waited = await limiter.acquire()
+            if waited:
+                logger.info(f'rate limited {endpoint}: queued {waited:.2f}s')
+            access_token = await self.token.get()
+            headers = {
+                "Authorization": f"Bearer {access_token}"
+            }
+            try:
+                with span('amadeus.http', endpoint=endpoint) as state:
+                    async with self.client.stream('GET', url, headers=headers, params=params) as response:
+                        if not response.is_success:
+                            state['error'] = f'HTTP {response.status_code}'
+                        reauthorize = response.status_code == 401 and not reauthorized
+                        retry = response.status_code in RETRY_STATUS and attempt < self.max_retries
+                        if not (retry or reauthorize):
+                            if stream_parser is not None and response.is_success:
+                                json_parsed = await stream_parser(response, params)
+                            else:
+                                json_parsed = self.__decode_body(response.status_code, await response.aread())
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.retry_backoff, self.max_retry_backoff)
+                logger.warning(f'{endpoint} request failed ({e!r}), retry {attempt + 1} in {delay:.2f}s')
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if reauthorize:
+                # revoked, or saved for other credentials: replace it (once) and try again
+                logger.warning(f'{endpoint} answered 401, refreshing the access token')
+                reauthorized = True
+                await self.token.refresh(force=True, rejected=access_token)
+                continue
+            if retry:
+                retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                delay = backoff_delay(attempt, self.retry_backoff, self.max_retry_backoff, retry_after)
+                if response.status_code == 429:
+                    limiter.pause(delay)
+                logger.warning(f'{endpoint} answered {response.status_code}, retry {attempt + 1} in {delay:.2f}s')
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            break
+        if response.is_success and not (isinstance(json_parsed, dict) and 'errors' in json_parsed):
+            self.cache.set(endpoint, cache_key, json_parsed)
+        return json_parsed
+
+    @staticmethod
+    def __decode_body(status: int, body: bytes):
+        """JSON body of a response; a body that is not JSON (e.g. a proxy's HTML error page)
+        becomes an Amadeus-style `{'errors': [...]}` so the tools report the status."""
+        try:
+            return json.loads(body)
+        except ValueError:
+            detail = ' '.join(body[:200].decode('utf-8', 'replace').split())
+            logger.warning(f'HTTP {status} answered with a non-JSON body: {detail}')
+            return {'errors': [{'status': status, 'detail': detail}]}
+
+    @staticmethod
+    def __errors_meta(res: dict) -> dict:
+        """`errors` meta value of a response that carries `errors`, else nothing."""
+        if not res.get('errors'):
+            return {}
+        return {'errors': json.dumps(res['errors'], ensure_ascii=False, separators=(',', ':'))}
+
+    def __encode(self, tool: str, records: list[dict], columns: list[str] | None = None, meta: dict | None = None) -> str:
+        """Encode a tool result in the tool's configured format and columns."""
+        fmt = self.output_format.get(tool, 'csv')
+        columns = columns or self.output_columns.get(tool)
+        encoded = encode_result(records, fmt, columns, meta)
+        logger.info(f'{tool} result: {len(records)} rows, {fmt} {len(encoded)} chars')
+        if self.log_encoded_sizes:
+            logger.info(f'{tool} encoded sizes: {encoded_sizes(records, columns, meta)}')
+        return encoded
+
+    @staticmethod
+    def __project(item: dict, field: str) -> str:
+        """Value of `field` (dotted paths allowed) as a short string; objects such as
+        `distance` or `geoCode` collapse to their values, e.g. `0.52 KM`."""
+        value = item
+        for key in field.split('.'):
+            value = value.get(key) if isinstance(value, dict) else None
+        if isinstance(value, dict):
+            return ' '.join(str(v) for v in value.values() if not isinstance(v, (dict, list)))
+        if isinstance(value, list):
+            return ' '.join(str(v) for v in value)
+        return '' if value is None else str(value)
+
+    def __hotel_city_parser(self, res: dict, fields: list[str], limit: int | None, page: int | None) -> str:
+        hotels = sorted(
+            res.get('data', []),
+            key=lambda h: h.get('distance', {}).get('value', float('inf')),
         )
-        return response
-
-    def __search_parser(self, res: dict) -> dict:
-        offers = []
-        print('data', res)
-        for o in res['data']:
-            # Base information
-            offer_id = o['id']
-            carrier_code = o['validatingAirlineCodes'][0]
-            carrier = res['dictionaries']['carriers'].get(carrier_code, 'N/A')
-            ac_code = o['itineraries'][0]['segments'][0]['aircraft']['code']
-            aircraft = res['dictionaries']['aircraft'][ac_code]
-            
-            # dep/ret schedule
-            dep = o['itineraries'][0]['segments'][0]
-            ret = o['itineraries'][1]['segments'][0]
-
-            via_flag = False
-            if len(o['itineraries'][0]['segments']) > 1:
-                via_flag = True 
-            if via_flag:
-                dep_str = f"{dep['departure']['at'][:16]} → {o['itineraries'][0]['segments'][-1]['arrival']['at'][:16]}"
-                ret_str = f"{ret['departure']['at'][:16]} → {o['itineraries'][1]['segments'][-1]['arrival']['at'][:16]}"
-            else:
-                dep_str = f"{dep['departure']['at'][:16]} → {dep['arrival']['at'][:16]}"
-                ret_str = f"{ret['departure']['at'][:16]} → {ret['arrival']['at'][:16]}"
-            
-            # duration
-            dur_dep = o['itineraries'][0]['duration'][2:].lower()
-            dur_ret = o['itineraries'][1]['duration'][2:].lower()
-            durations = f"{dur_dep} / {dur_ret}"
-            
-            # price
-            total_price = o['price']['total']
-            adult_price = next(t for t in o['travelerPricings'] if t['travelerType']=='ADULT')['price']['total']
-            child_tp = next((t for t in o['travelerPricings'] if t['travelerType']=='CHILD'), None)
-            child_price = child_tp['price']['total'] if child_tp else 0
-            
-            # cabin
-            fb = next(t for t in o['travelerPricings'] if t['travelerType']=='ADULT')['fareDetailsBySegment'][0]
-            icb = fb.get('includedCheckedBags', {})
-            if 'weight' in icb:
-                checked = f"{icb['weight']} {icb['weightUnit']}"
-            else:
-                checked = f"{icb.get('quantity', 0)} 개"
-            cabin = fb.get('includedCabinBags', {}).get('quantity', 0)
-            
-            offers.append({
-                'ID': offer_id,
-                'Airlines (aricraft)': f"{carrier} ({aircraft})",
-                'Transit': via_flag,
-                'Departure schedule': dep_str,
-                'Return schedule': ret_str,
-                'Duration (one way/turnaround)': durations,
-                'Total fare (USD)': total_price,
-                'Adult': adult_price,
-                'Child': child_price,
-                'Checked': checked,
-                'Cabin': cabin
-            })
+        limit = limit if limit and limit > 0 else len(hotels) or 1
+        pages = max(1, -(-len(hotels) // limit))
+        page = min(max(1, page or 1), pages)
+        records = [
+            {field: self.__project(hotel, field) for field in fields}
+            for hotel in hotels[(page - 1) * limit: page * limit]
+        ]
+        meta = {'total': len(hotels), 'page': f'{page}/{pages}', **self.__errors_meta(res)}
+        return self.__encode('list_hotel_by_city', records, fields, meta)
+
+    def __hotel_offer_parser(self, res: dict) -> str:
+        records = []
+        for hotel_offers in res.get('data', []):
+            hotel = hotel_offers.get('hotel', {})
+            for offer in hotel_offers.get('offers', []):
+                room = offer.get('room', {}).get('typeEstimated', {})
+                records.append({
+                    'hotelId': hotel.get('hotelId'),
+                    'name': hotel.get('name'),
+                    'offerId': offer.get('id'),
+                    'checkIn': offer.get('checkInDate'),
+                    'checkOut': offer.get('checkOutDate'),
+                    'room': room.get('category'),
+                    'beds': f"{room.get('beds', '')} {room.get('bedType', '')}".strip(),
+                    'board': offer.get('boardType'),
+                    'total': offer.get('price', {}).get('total'),
+                    'currency': offer.get('price', {}).get('currency'),
+                })
+        return self.__encode('search_hotel_offer', records, meta=self.__errors_meta(res))
+
+    @staticmethod
+    def __flight_offer_record(o: dict) -> dict:
+        """Compact record of one flight offer. Carrier and aircraft are left as codes until the
+        response's `dictionaries` are known (see `__resolve_flight_offer`)."""
+        outbound = o['itineraries'][0]
+        inbound = o['itineraries'][1] if len(o['itineraries']) > 1 else None  # None for one-way
+
+        def schedule(itinerary):
+            segments = itinerary['segments']
+            return f"{segments[0]['departure']['at'][:16]} → {segments[-1]['arrival']['at'][:16]}"
+
+        def duration(itinerary):
+            return itinerary['duration'][2:].lower()
+
+        # price
+        adult_tp = next(t for t in o['travelerPricings'] if t['travelerType']=='ADULT')
+        child_tp = next((t for t in o['travelerPricings'] if t['travelerType']=='CHILD'), None)
+
+        # cabin
+        fb = adult_tp['fareDetailsBySegment'][0]
+        icb = fb.get('includedCheckedBags', {})
+        if 'weight' in icb:
+            checked = f"{icb['weight']} {icb['weightUnit']}"
+        else:
+            checked = f"{icb.get('quantity', 0)} 개"
+
+        return {
+            'ID': o['id'],
+            'Airlines (aricraft)': (o['validatingAirlineCodes'][0], outbound['segments'][0]['aircraft']['code']),
+            'Transit': len(outbound['segments']) > 1,
+            'Departure schedule': schedule(outbound),
+            'Return schedule': schedule(inbound) if inbound else None,
+            'Duration (one way/turnaround)': f"{duration(outbound)} / {duration(inbound)}" if inbound else duration(outbound),
+            'Total fare (USD)': o['price']['total'],
+            'Adult': adult_tp['price']['total'],
+            'Child': child_tp['price']['total'] if child_tp else 0,
+            'Checked': checked,
+            'Cabin': fb.get('includedCabinBags', {}).get('quantity', 0),
+        }
+
+    @staticmethod
+    def __resolve_flight_offer(record: dict, dictionaries: dict) -> None:
+        carrier_code, ac_code = record['Airlines (aricraft)']
+        carrier = dictionaries.get('carriers', {}).get(carrier_code, 'N/A')
+        aircraft = dictionaries.get('aircraft', {}).get(ac_code, ac_code)
+        record['Airlines (aricraft)'] = f"{carrier} ({aircraft})"
+
+    async def __parse_flight_offers(self, response: httpx.Response, params: dict) -> list[dict]:
+        """Stream a flight-offers body: offers are decoded and reduced one at a time, decoding
+        stops after `max` offers, and parsing stops as soon as `dictionaries` has been seen too.
+        The rest of the body is still read (not parsed), so the keep-alive connection goes back
+        to the pool instead of being closed."""
+        stream = JsonObjectStream(item_keys={'data'}, value_keys={'dictionaries'}, max_items=params.get('max'))
+        offers, unresolved = [], []
+        dictionaries = None
+
+        def handle(events):
+            nonlocal dictionaries, unresolved
+            for kind, _, value in events:
+                if kind == 'value':
+                    dictionaries = value
+                    for record in unresolved:
+                        self.__resolve_flight_offer(record, dictionaries)
+                    unresolved = []
+                    continue
+                record = self.__flight_offer_record(value)
+                if dictionaries is None:
+                    unresolved.append(record)
+                else:
+                    self.__resolve_flight_offer(record, dictionaries)
+                offers.append(record)
+
+        satisfied = False
+        async for chunk in response.aiter_text():
+            if satisfied:
+                continue  # drain only
+            handle(stream.feed(chunk))
+            satisfied = stream.satisfied
+        if not satisfied:
+            handle(stream.close())
+        for record in unresolved:
+            self.__resolve_flight_offer(record, {})
         return offers
-    
-    def search_fligiht(self, 
+
+    async def search_fligiht(self, 
             originLocationCode: str, # IATA code
             destinationLocationCode: str, # IATA code
             departureDate: str, # ISO 8601
@@ -139,6 +472,7 @@ class amadeus_tools:
             currencyCode: Optional[str] = "USD",# ISO 4217 format
             maxPrice: Optional[int] = None,
             max: Optional[int] = 5,
+            refresh: bool = False,
         ):
         """
         This tool to find flight. If children does not exist, children is null.
@@ -158,23 +492,31 @@ class amadeus_tools:
             currencyCode (str, optional): if set to true, the search will find only flights going from the origin to the destination with no stop in between. defualt "USD"
             maxPrice (int, optional): maximum price per traveler. By default, no limit is applied. If specified, the value should be a positive number with no decimals
             max (int, optional): maximum number of flight offers to return. If specified, the value should be greater than or equal to 1. default 5
+            refresh (bool, optional): fetch fresh offers from Amadeus instead of recently cached ones, e.g. when the user asks for up-to-date prices. default false
 
         Returns:
             str: The result of searching flight.
 
         """
         print('hello?')
-        response = self.__request_api(self.url['airplan_by_schedule'], dict(locals()))
-        result_json = {}
+        args = dict(locals())
+        args.pop('refresh')
+        offers = await self.__request_api(
+            self.url['airplan_by_schedule'], args, use_cache=not refresh, stream_parser=self.__parse_flight_offers
+        )
+        meta = None
+        if isinstance(offers, dict):
+            # an error body (e.g. `{"errors": [...]}`) instead of streamed offers; report it like
+            # `search_hotel_offer` does so the model can tell a failure from "no flights"
+            meta = {'errors': json.dumps(offers.get('errors', offers), ensure_ascii=False, separators=(',', ':'))}
+            offers = []
         try:
-            json_parsed = json.loads(response.text)
-            result_json = self.__search_parser(json_parsed)
-            # result_json = json_parsed
-        except BaseException as e:
+            return self.__encode('search_fligiht', offers, meta=meta)
+        except Exception as e:
             logger.error(f'Fail getting flgiht offer: {e}')
-        return result_json
+            return self.__encode('search_fligiht', [], meta={'errors': f'could not read flight offers: {e}'})
     
-    def search_flight_by_origin(
+    async def search_flight_by_origin(
         self,
         origin: str,
         departureDate: str | None = None,
@@ -183,22 +525,25 @@ class amadeus_tools:
         nonStop: bool | None = None,
         maxPrice: int | None = None,
         viewBy: str | None = None,
+        refresh: bool = False,
     ):
         logger.info(f'in search_flight by origin inininiin')
         def flight_origin_parser(data:dict) -> str:
             target_columns = ['origin', 'destination', 'departureDate', 'returnDate', 'price']
-            parsed_data = ','.join(target_columns)
-            if data['data']:
-                for dd in data['data']:
-                    if dd['type'] == 'flight-destination':
-                        parsed_data += '\n' + ','.join([dd[tc] if tc != 'price' else dd[tc]['total'] for tc in target_columns])
-                parsed_data += f"\n currencies: {data['meta']['currency']}"
-            return parsed_data
+            records = [
+                {tc: dd[tc] if tc != 'price' else dd[tc]['total'] for tc in target_columns}
+                for dd in data.get('data') or [] if dd['type'] == 'flight-destination'
+            ]
+            meta = {'currencies': data['meta']['currency']} if data.get('data') else {}
+            meta.update(self.__errors_meta(data))
+            # [amadeus.output_columns] wins; all target columns otherwise, even for an empty result
+            columns = self.output_columns.get('search_flight_by_origin') or target_columns
+            return self.__encode('search_flight_by_origin', records, columns, meta)
         logger.info(f'in search_flight by origin')
-        response = self.__request_api(self.url['airplan_by_origin'], dict(locals()))
-        logger.info(f'response: {response}, {response.text}')
+        args = dict(locals())
+        args.pop('refresh')
+        json_parsed = await self.__request_api(self.url['airplan_by_origin'], args, use_cache=not refresh)
         try: 
-            json_parsed = json.loads(response.text)
             logger.info(f'result raw: {json_parsed}')
             csv_parsed = flight_origin_parser(json_parsed)
             logger.info(f'result: {csv_parsed}')
@@ -207,7 +552,7 @@ class amadeus_tools:
             logger.error(f'Fail getting flight by origin: {e}')
         return None
 
-    def list_hotel_by_city(
+    async def list_hotel_by_city(
         self,
         cityCode: str, 
         radius: int | None = None,
@@ -216,8 +561,12 @@ class amadeus_tools:
         amenities: list[str] | None = None, 
         ratings: list[str] | None = None,
         hotelSource: str | None = None,
-    ) -> dict | None: # This information is almost last updated 2023
-        """This tool to find hotels by city.
+        fields: list[str] | None = None,
+        limit: int | None = 20,
+        page: int | None = 1,
+        refresh: bool = False,
+    ) -> str | None: # This information is almost last updated 2023
+        """This tool to find hotels by city. Hotels are sorted by distance from the center and returned as a table.
 
         Args:
             cityCode (str): Destination city code or airport code. In case of city code , the search will be done around the city center. Available codes can be found in IATA table codes (3 chars IATA Code). Example: PAR
@@ -227,17 +576,29 @@ class amadeus_tools:
             amenities (list[str], optional): List of amenities. Available values : SWIMMING_POOL, SPA, FITNESS_CENTER, AIR_CONDITIONING, RESTAURANT, PARKING, PETS_ALLOWED, AIRPORT_SHUTTLE, BUSINESS_CENTER, DISABLED_FACILITIES, WIFI, MEETING_ROOMS, NO_KID_ALLOWED, TENNIS, GOLF, KITCHEN, ANIMAL_WATCHING, BABY-SITTING, BEACH, CASINO, JACUZZI, SAUNA, SOLARIUM, MASSAGE, VALET_PARKING, BAR or LOUNGE, KIDS_WELCOME, NO_PORN_FILMS, MINIBAR, TELEVISION, WI-FI_IN_ROOM, ROOM_SERVICE, GUARDED_PARKG, SERV_SPEC_MENU
             ratings (list[str], optional): Hotel stars. Up to four values can be requested at the same time in a comma separated list. Available values: 1, 2, 3, 4, 5
             hotelSource (str, optional): Hotel source with values BEDBANK for aggregators, DIRECTCHAIN for GDS/Distribution and ALL for both. Available values : BEDBANK, DIRECTCHAIN, ALL. Default values: ALL.
+            fields (list[str], optional): Columns to return. Available values: hotelId, name, distance, chainCode, iataCode, geoCode, address, lastUpdate. Default: hotelId, name, distance.
+            limit (int, optional): Number of nearest hotels per page. Default value: 20.
+            page (int, optional): Page of the distance-sorted list, starting at 1. Default value: 1.
+            refresh (bool, optional): Fetch a fresh list from Amadeus instead of a cached one. Default value: false.
         """
-        response = self.__request_api(self.url['hotel_by_city'], dict(locals()))    
+        args = dict(locals())
+        for key in ('fields', 'limit', 'page', 'refresh'):
+            args.pop(key)
+        json_parsed = await self.__request_api(self.url['hotel_by_city'], args, use_cache=not refresh)
         try:
-            json_parsed = json.loads(response.text)
-            logger.info(f'hotels : {json_parsed}')
-            return json_parsed
+            csv_parsed = self.__hotel_city_parser(
+                json_parsed,
+                fields or self.output_columns.get('list_hotel_by_city') or self.HOTEL_BY_CITY_FIELDS,
+                limit,
+                page,
+            )
+            logger.info(f'hotels : {csv_parsed}')
+            return csv_parsed
         except BaseException as e:
             logger.error(f'Fail getting hotel by city: {e}')
         return None
 
-    def search_hotel_offer(
+    async def search_hotel_offer(
         self,
         hotelIds: str,
         adults: int | None = None,
@@ -252,11 +613,12 @@ class amadeus_tools:
         includeClosed: bool | None = None,
         bestRateOnly: bool | None = None,
         lang: str | None =None,
-    ) -> dict | None: # It has a lot of provider errors
+        refresh: bool = False,
+    ) -> str | None: # It has a lot of provider errors
         """This tool to find offer by hotelIds.
 
         Args:
-            hotelIds (str): Amadeus property codes on 8 chars. Mandatory parameter for a search by predefined list of hotels.
+            hotelIds (str): Amadeus property codes on 8 chars, comma separated. Mandatory parameter for a search by predefined list of hotels.
             adults (int, optional): Number of adult guests (1-9) per room. Default value: 1.
             checkInDate (str, optional): Check-in date of the stay (hotel local date). Format YYYY-MM-DD. The lowest accepted value is the present date (no dates in the past). If not present, the default value will be today's date in the GMT time zone. Example: 2023-11-22
             checkOutDate (str, optional): Check-out date of the stay (hotel local date). Format YYYY-MM-DD. The lowest accepted value is checkInDate+1. If not present, it will default to checkInDate +1.
@@ -269,11 +631,56 @@ class amadeus_tools:
             includeClosed (bool, optional): Show all properties (include sold out) or available only. For sold out properties, please check availability on other dates.
             bestRateOnly (bool, optional): Used to return only the cheapest offer per hotel or all available offers.
             lang (str, optional): Requested language of descriptive texts. Examples: FR , fr , fr-FR.
+            refresh (bool, optional): Fetch fresh offers from Amadeus instead of recently cached ones, e.g. when the user asks for up-to-date prices. Default value: false.
         """
-        response = self.__request_api(self.url['hotel_offers'], dict(locals()))
+        args = dict(locals())
+        args.pop('self')
+        args.pop('refresh')
         try:
-            json_parsed = json.loads(response.text)
-            return json_parsed
+            hotel_ids = [hotel_id.strip() for hotel_id in hotelIds.split(',') if hotel_id.strip()]
+            return self.__hotel_offer_parser(await self.__search_hotel_offer_chunks(hotel_ids, args, use_cache=not refresh))
         except BaseException as e:
             logger.error(f'Fail getting hotel by offer: {e}')
         return None
+
+    async def __search_hotel_offer_chunks(self, hotel_ids: list[str], args: dict, use_cache: bool = True) -> dict:
+        """Query `hotel_ids` in concurrent chunks and merge the offers.
+
+        A chunk that fails (request error, or errors without any offer) is retried up to
+        `hotel_offer_chunk_retries` times, split in halves so a single bad property cannot
+        sink the others. Offers of successful chunks are always kept; errors of chunks that
+        still fail are reported next to them.
+        """
+        async def search_chunk(chunk: list[str]) -> tuple[list[str], dict | None, list]:
+            try:
+                result = await self.__request_api(
+                    self.url['hotel_offers'], {**args, 'hotelIds': ','.join(chunk)}, use_cache=use_cache
+                )
+            except Exception as e:
+                return chunk, None, [{'title': 'REQUEST FAILED', 'detail': str(e)}]
+            if result.get('data'):
+                return chunk, result, result.get('errors', [])
+            return chunk, None, result.get('errors', [{'title': 'NO DATA'}])
+
+        size = self.hotel_offer_chunk_size
+        pending = [hotel_ids[i:i + size] for i in range(0, len(hotel_ids), size)]
+        data, errors = [], []
+        for attempt in range(self.hotel_offer_chunk_retries + 1):
+            results = await asyncio.gather(*[search_chunk(chunk) for chunk in pending])
+            pending, failed_errors = [], []
+            for chunk, result, chunk_errors in results:
+                if result is not None:
+                    data.extend(result['data'])
+                    errors.extend(chunk_errors)
+                else:
+                    pending.append(chunk)
+                    failed_errors.append({'hotelIds': ','.join(chunk), 'errors': chunk_errors})
+            if not pending or attempt == self.hotel_offer_chunk_retries:
+                errors.extend(failed_errors)
+                break
+            logger.info(f'hotel offers: retrying {len(pending)} failed chunks')
+            pending = [half for chunk in pending for half in (chunk[:(len(chunk) + 1) // 2], chunk[(len(chunk) + 1) // 2:]) if half]
+        merged = {'data': data}
+        if errors:
+            merged['errors'] = errors
+        return merged
@@ -0,0 +1,193 @@
+import json
+from typing import Any, Iterator
+
+_WHITESPACE = ' \t\r\n'
+
+
+class JsonObjectStream:
+    """Incremental reader of a top-level JSON object, fed text chunk by chunk.
+
+    Only the parts that are asked for are decoded:
+
+    - every element of the arrays named in `item_keys` is decoded on its own and yielded as
+      `('item', key, value)`, so one large array never sits in memory as a whole. After
+      `max_items` elements the rest of the array is only scanned, not decoded.
+    - the values named in `value_keys` are decoded whole and yielded as `('value', key, value)`.
+
+    Everything else is scanned and dropped. Text that has been scanned past is discarded, so
+    memory stays bounded by the largest decoded value rather than by the payload.
+    """
+
+    def __init__(self, item_keys: set[str] = frozenset(), value_keys: set[str] = frozenset(), max_items: int | None = None):
+        self.item_keys = set(item_keys)
+        self.value_keys = set(value_keys)
+        self.max_items = max_items
+        self.items_decoded = 0
+        self.values_seen: set[str] = set()
+        self._buffer = ''
+        self._pos = 0
+        self._state = 'start'
+        self._key = None
+        # value scanner state, kept across chunks
+        self._value_start = None
+        self._scan_pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    @property
+    def satisfied(self) -> bool:
+        """True once nothing more would be decoded: item limit reached and all values seen."""
+        items_done = self.max_items is not None and self.items_decoded >= self.max_items
+        return (items_done or not self.item_keys) and self.values_seen >= self.value_keys
+
+    def feed(self, text: str) -> Iterator[tuple[str, str, Any]]:
+        self._buffer += text
+        yield from self._parse(final=False)
+        self._compact()
+
+    def close(self) -> Iterator[tuple[str, str, Any]]:
+        yield from self._parse(final=True)
+        if self._state != 'done':
+            raise ValueError(f'truncated JSON document (state {self._state})')
+
+    def _compact(self) -> None:
+        keep_from = self._pos if self._value_start is None else self._value_start
+        if keep_from:
+            self._buffer = self._buffer[keep_from:]
+            self._pos -= keep_from
+            self._scan_pos -= keep_from
+            if self._value_start is not None:
+                self._value_start -= keep_from
+
+    def _skip_whitespace(self) -> bool:
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+            self._pos += 1
+        return self._pos < len(self._buffer)
+
+    def _expect(self, chars: str) -> str | None:
+        if not self._skip_whitespace():
+            return None
+        char = self._buffer[self._pos]
+        if char not in chars:
+            raise ValueError(f'unexpected {char!r} at state {self._state}, expected one of {chars!r}')
+        self._pos += 1
+        return char
+
+    def _scan_value(self, final: bool) -> int | None:
+        """End index of the value starting at `_value_start`, or None if it is not complete yet."""
+        buffer = self._buffer
+        first = buffer[self._value_start]
+        i = self._scan_pos
+        if first == '"' or first in '{[':
+            while i < len(buffer):
+                char = buffer[i]
+                if self._in_string:
+                    if self._escape:
+                        self._escape = False
+                    elif char == '\\':
+                        self._escape = True
+                    elif char == '"':
+                        self._in_string = False
+                        if self._depth == 0:
+                            return i + 1
+                elif char == '"':
+                    self._in_string = True
+                elif char in '{[':
+                    self._depth += 1
+                elif char in '}]':
+                    self._depth -= 1
+                    if self._depth == 0:
+                        return i + 1
+                i += 1
+        else:
+            while i < len(buffer) and buffer[i] not in ',}]' + _WHITESPACE:
+                i += 1
+            if i < len(buffer) or final:
+                return i
+        self._scan_pos = i
+        return None
+
+    def _start_value(self) -> bool:
+        if not self._skip_whitespace():
+            return False
+        self._value_start = self._scan_pos = self._pos
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        return True
+
+    def _parse(self, final: bool) -> Iterator[tuple[str, str, Any]]:
+        while True:
+            state = self._state
+            if state == 'start':
+                if self._expect('{') is None:
+                    return
+                self._state = 'key_or_end'
+            elif state in ('key_or_end', 'key'):
+                char = self._expect('"}' if state == 'key_or_end' else '"')
+                if char is None:
+                    return
+                if char == '}':
+                    self._state = 'done'
+                    continue
+                self._pos -= 1
+                self._start_value()
+                end = self._scan_value(final)
+                if end is None:
+                    return
+                self._key = json.loads(self._buffer[self._value_start:end])
+                self._pos, self._value_start = end, None
+                self._state = 'colon'
+            elif state == 'colon':
+                if self._expect(':') is None:
+                    return
+                self._state = 'value'
+            elif state == 'value':
+                if not self._skip_whitespace():
+                    return
+                if self._key in self.item_keys and self._buffer[self._pos] == '[':
+                    self._pos += 1
+                    self._state = 'item_or_end'
+                    continue
+                if self._value_start is None:
+                    self._start_value()
+                end = self._scan_value(final)
+                if end is None:
+                    return
+                if self._key in self.value_keys:
+                    self.values_seen.add(self._key)
+                    yield 'value', self._key, json.loads(self._buffer[self._value_start:end])
+                self._pos, self._value_start = end, None
+                self._state = 'after_value'
+            elif state in ('item_or_end', 'item'):
+                if not self._skip_whitespace():
+                    return
+                if state == 'item_or_end' and self._buffer[self._pos] == ']':
+                    self._pos += 1
+                    self._state = 'after_value'
+                    continue
+                if self._value_start is None:
+                    self._start_value()
+                end = self._scan_value(final)
+                if end is None:
+                    return
+                if self.max_items is None or self.items_decoded < self.max_items:
+                    self.items_decoded += 1
+                    yield 'item', self._key, json.loads(self._buffer[self._value_start:end])
+                self._pos, self._value_start = end, None
+                self._state = 'after_item'
+            elif state == 'after_item':
+                char = self._expect(',]')
+                if char is None:
+                    return
+                self._state = 'item' if char == ',' else 'after_value'
+            elif state == 'after_value':
+                char = self._expect(',}')
+                if char is None:
+                    return
+                self._state = 'key' if char == ',' else 'done'
+            elif state == 'done':
+                if self._skip_whitespace():
+                    raise ValueError('unexpected data after the JSON document')
+                return
@@ -0,0 +1,139 @@
+import asyncio
+import datetime
+import email.utils
+import json
+import logging
+import random
+import time
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; each worker then keeps its own bucket
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Quota of `rate` requests per second with bursts of up to `capacity` requests.
+
+    `acquire()` hands out slots in arrival order: when the bucket is empty, each caller
+    reserves the next free slot and sleeps until it comes, so a queue of requests drains at
+    exactly the quota instead of bursting into 429s.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, tokens: float, updated: float, now: float) -> float:
+        return min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+
+    def _update(self, change: Callable[[float], float]) -> float:
+        """Refill, apply `change` to the token count and return the new count."""
+        now = time.monotonic()
+        self._tokens = change(self._refill(self._tokens, self._updated, now))
+        self._updated = now
+        return self._tokens
+
+    async def _take(self, change: Callable[[float], float]) -> float:
+        return self._update(change)
+
+    def _adjust(self, change: Callable[[float], float]) -> None:
+        """`_update` without waiting for the result."""
+        self._update(change)
+
+    async def acquire(self) -> float:
+        """Wait for a slot and return how long the caller was queued."""
+        if self.rate <= 0:
+            return 0.0
+        tokens = await self._take(lambda t: t - 1)
+        if tokens >= 0:
+            return 0.0
+        wait = -tokens / self.rate
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self._adjust(lambda t: t + 1)  # give the reserved slot back
+            raise
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """Hold back every caller for `seconds` (e.g. after the server answered 429)."""
+        if self.rate <= 0:
+            return
+        self._adjust(lambda t: min(t, -seconds * self.rate))
+
+
+class SharedTokenBucket(TokenBucket):
+    """`TokenBucket` whose state lives in the JSON file `path`, under `key`, so several worker
+    processes draw on one quota instead of each sending `rate` requests per second.
+
+    Every update locks the file, so it runs in a thread; pauses and refunds are not waited
+    for. Without `fcntl`, or when the file cannot be used, the bucket falls back to
+    per-process state.
+    """
+
+    def __init__(self, rate: float, capacity: float, path: str, key: str):
+        super().__init__(rate, capacity)
+        self.path = path if fcntl is not None else None
+        self.key = key
+        if fcntl is None:
+            logger.warning('fcntl is unavailable: the Amadeus rate limit is enforced per worker')
+
+    def _update(self, change: Callable[[float], float]) -> float:
+        if self.path is None:
+            return super()._update(change)
+        try:
+            with open(self.path, 'a+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = {}
+                now = time.time()  # comparable across processes
+                tokens, updated = state.get(self.key, (self.capacity, now))
+                tokens = change(self._refill(tokens, updated, now))
+                state[self.key] = [tokens, now]
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+        except OSError as e:
+            logger.warning(f'rate limit file {self.path} failed, limiting per worker: {e}')
+            return super()._update(change)
+        return tokens
+
+    async def _take(self, change: Callable[[float], float]) -> float:
+        return await asyncio.to_thread(self._update, change)
+
+    def _adjust(self, change: Callable[[float], float]) -> None:
+        asyncio.get_running_loop().run_in_executor(None, self._update, change)
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a `Retry-After` header (delta-seconds or HTTP-date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int, base: float, maximum: float, retry_after: float | None = None) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's `Retry-After`."""
+    delay = random.uniform(0, min(maximum, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+
+class ResponseCache:
+    """Cache of parsed Amadeus responses keyed on endpoint + normalized query parameters.
+
+    Lookups go to an in-memory LRU first and then, when `sqlite_path` is set, to an SQLite
+    file that survives restarts and can be shared by several workers. Every endpoint has its
+    own TTL in seconds (`ttls`, falling back to `default_ttl`); a TTL of 0 disables caching
+    for that endpoint.
+
+    SQLite calls run on a single background thread, so a slow disk or another worker holding
+    the write lock never stalls the event loop. `set` updates memory at once and queues the
+    disk write; a `get` queued after it sees the new row.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        sqlite_path: str | None = None,
+        ttls: dict[str, float] | None = None,
+        default_ttl: float = 0,
+    ):
+        self.max_entries = max_entries
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self._memory: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._stats: dict[str, dict[str, int]] = defaultdict(lambda: {'memory_hits': 0, 'disk_hits': 0, 'misses': 0})
+        self._db: sqlite3.Connection | None = None
+        self._db_lock = threading.Lock()
+        self._db_executor: ThreadPoolExecutor | None = None
+        self._writes = 0
+        if sqlite_path:
+            # several worker processes may write at once: WAL lets readers go on during a write,
+            # and a writer waits up to `timeout` seconds for the lock instead of failing
+            self._db = sqlite3.connect(sqlite_path, check_same_thread=False, isolation_level=None, timeout=5)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=NORMAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS response_cache ('
+                'key TEXT PRIMARY KEY, endpoint TEXT, expires_at REAL, value TEXT)'
+            )
+            self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='response-cache')
+
+    @staticmethod
+    def make_key(endpoint: str, params: dict) -> str:
+        normalized = sorted((str(k), json.dumps(v, sort_keys=True, default=str)) for k, v in params.items())
+        raw = json.dumps([endpoint, normalized], ensure_ascii=False)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def ttl(self, endpoint: str) -> float:
+        return self.ttls.get(endpoint, self.default_ttl)
+
+    async def get(self, endpoint: str, key: str) -> Any:
+        """Cached value, or `MISSING`."""
+        stats = self._stats[endpoint]
+        now = time.time()
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                stats['memory_hits'] += 1
+                return entry[1]
+            del self._memory[key]
+        if self._db is not None:
+            try:
+                row = await asyncio.get_running_loop().run_in_executor(self._db_executor, self._read, key, now)
+            except sqlite3.Error as e:
+                logger.warning(f'response cache read failed: {e}')
+                row = None
+            if row is not None:
+                value = json.loads(row[1])
+                self._remember(key, row[0], value)
+                stats['disk_hits'] += 1
+                return value
+        stats['misses'] += 1
+        return MISSING
+
+    def set(self, endpoint: str, key: str, value: Any) -> None:
+        ttl = self.ttl(endpoint)
+        if ttl <= 0:
+            return
+        expires_at = time.time() + ttl
+        self._remember(key, expires_at, value)
+        if self._db is not None:
+            future = self._db_executor.submit(
+                self._write, key, endpoint, expires_at, json.dumps(value, ensure_ascii=False)
+            )
+            future.add_done_callback(self._log_write_error)
+
+    def _read(self, key: str, now: float) -> tuple[float, str] | None:
+        with self._db_lock:
+            return self._db.execute(
+                'SELECT expires_at, value FROM response_cache WHERE key = ? AND expires_at > ?', (key, now)
+            ).fetchone()
+
+    def _write(self, key: str, endpoint: str, expires_at: float, value: str) -> None:
+        with self._db_lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO response_cache (key, endpoint, expires_at, value) VALUES (?, ?, ?, ?)',
+                (key, endpoint, expires_at, value),
+            )
+            self._writes += 1
+            if self._writes % 256 == 0:
+                self._db.execute('DELETE FROM response_cache WHERE expires_at <= ?', (time.time(),))
+
+    @staticmethod
+    def _log_write_error(future: Future) -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.warning(f'response cache write failed: {future.exception()}')
+
+    def _remember(self, key: str, expires_at: float, value: Any) -> None:
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        self._memory.clear()
+        if self._db is not None:
+            # behind any queued writes, so none of them lands after the clear
+            self._db_executor.submit(self._delete_all).result()
+
+    def _delete_all(self) -> None:
+        with self._db_lock:
+            self._db.execute('DELETE FROM response_cache')
+
+    def stats(self) -> dict:
+        """Hit/miss counters per endpoint plus the overall hit rate."""
+        endpoints = {endpoint: dict(counts) for endpoint, counts in self._stats.items()}
+        hits = sum(c['memory_hits'] + c['disk_hits'] for c in endpoints.values())
+        lookups = hits + sum(c['misses'] for c in endpoints.values())
+        return {
+            'endpoints': endpoints,
+            'memory_entries': len(self._memory),
+            'hit_rate': hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,170 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
+from fastmcp.exceptions import ToolError
+
+from src.tracing import record
+
+logger = logging.getLogger(__name__)
+
+
+class ToolLane:
+    """Concurrency slots, queue and counters of one tool."""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, timeout: float | None):
+        self.name = name
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.timeout = timeout or None
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.running = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timed_out = 0
+
+    @property
+    def full(self) -> bool:
+        return self.semaphore.locked() and self.queued >= self.max_queue
+
+    def stats(self) -> dict:
+        return {
+            'running': self.running, 'queued': self.queued, 'completed': self.completed,
+            'rejected': self.rejected, 'timed_out': self.timed_out,
+        }
+
+
+class ToolScheduler:
+    """Runs MCP tool calls under per-tool concurrency, queue-depth and deadline limits.
+
+    Each tool gets `max_concurrency` slots; up to `max_queue` further calls wait for one in
+    arrival order, and a call beyond that fails at once with a `ToolError` saying the tool
+    is overloaded, instead of piling up. `timeout` covers queue wait and execution; when it
+    passes, the call is cancelled and fails with a `ToolError`. `limits` overrides these per
+    tool name, e.g. to keep a burst of hotel-offer searches from starving flight searches.
+
+    Async tools run on the event loop. Blocking (sync) tools run in a pool of `workers`
+    threads; a thread cannot be interrupted, so a timed out sync call keeps its slot until
+    it returns. Queue wait is recorded as span `mcp.tool_queue`.
+    """
+
+    def __init__(
+        self,
+        workers: int = 8,
+        max_concurrency: int = 4,
+        max_queue: int = 16,
+        timeout: float | None = 25,
+        limits: dict[str, dict[str, Any]] | None = None,
+    ):
+        self.workers = workers
+        self.defaults = {'max_concurrency': max_concurrency, 'max_queue': max_queue, 'timeout': timeout}
+        self.limits = limits or {}
+        self.lanes: dict[str, ToolLane] = {}
+        self._executor: ThreadPoolExecutor | None = None
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> "ToolScheduler":
+        keys = ('workers', 'max_concurrency', 'max_queue', 'timeout')
+        return cls(**{key: config[key] for key in keys if key in config}, limits=config.get('tools'))
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='mcp-tool')
+        return self._executor
+
+    def lane(self, name: str) -> ToolLane:
+        lane = self.lanes.get(name)
+        if lane is None:
+            lane = self.lanes[name] = ToolLane(name, **{**self.defaults, **self.limits.get(name, {})})
+        return lane
+
+    def wrap(self, fn: Callable, name: str | None = None) -> Callable:
+        """`fn` as an async tool function whose calls go through the scheduler. The signature
+        is kept (`functools.wraps`), so FastMCP derives the same input schema."""
+        name = name or fn.__name__
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            return await self.run(name, fn, *args, **kwargs)
+        return wrapper
+
+    async def run(self, name: str, fn: Callable, *args, **kwargs) -> Any:
+        lane = self.lane(name)
+        if lane.full:
+            lane.rejected += 1
+            logger.warning(f'tool {name} overloaded: {lane.running} running, {lane.queued} queued')
+            raise ToolError(
+                f'{name} is overloaded ({lane.running} running, {lane.queued} queued); try again shortly'
+            )
+        start = time.perf_counter()
+        acquired, phase = False, 'queued'
+        lane.queued += 1
+        try:
+            async with asyncio.timeout(lane.timeout):
+                try:
+                    await lane.semaphore.acquire()
+                    acquired = True
+                finally:
+                    lane.queued -= 1
+                waited = time.perf_counter() - start
+                record('mcp.tool_queue', waited, tool=name)
+                if waited > 1:
+                    logger.info(f'tool {name} waited {waited:.2f}s for a slot')
+                lane.running += 1
+                phase = 'executing'
+                try:
+                    if inspect.iscoroutinefunction(fn):
+                        result = await fn(*args, **kwargs)
+                    else:
+                        acquired = False  # handed to the thread, which gives the slot back when it returns
+                        result = await self._run_in_thread(lane, fn, *args, **kwargs)
+                finally:
+                    lane.running -= 1
+                lane.completed += 1
+                return result
+        except TimeoutError:
+            lane.timed_out += 1
+            logger.warning(f'tool {name} cancelled after its deadline of {lane.timeout}s ({phase})')
+            raise ToolError(f'{name} did not finish within {lane.timeout}s and was cancelled') from None
+        finally:
+            if acquired:
+                lane.semaphore.release()
+
+    async def _run_in_thread(self, lane: ToolLane, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        try:
+            future = self.executor.submit(context.run, functools.partial(fn, *args, **kwargs))
+        except BaseException:
+            lane.semaphore.release()
+            raise
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(lane.semaphore.release))
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        return {name: lane.stats() for name, lane in self.lanes.items()}
+
+    def samples(self) -> list[tuple[str, str, str, dict, float]]:
+        """Per-tool gauges and counters for `metrics.register_collector`."""
+        samples = []
+        for name, lane in self.lanes.items():
+            samples += [
+                ('mcp_tool_running', 'gauge', 'Tool calls executing.', {'tool': name}, lane.running),
+                ('mcp_tool_queued', 'gauge', 'Tool calls waiting for a slot.', {'tool': name}, lane.queued),
+                ('mcp_tool_rejected_total', 'counter', 'Tool calls refused because the queue was full.',
+                 {'tool': name}, lane.rejected),
+                ('mcp_tool_timeouts_total', 'counter', 'Tool calls cancelled at their deadline.',
+                 {'tool': name}, lane.timed_out),
+            ]
+        return samples
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
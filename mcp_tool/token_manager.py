@@ -0,0 +1,135 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; workers then may refresh the token concurrently
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class AccessTokenManager:
+    """OAuth2 client-credentials token shared by every request of the process.
+
+    - Concurrent callers that find the token missing or expired wait on a single refresh
+      instead of each posting to the token endpoint.
+    - Once the token is within `refresh_margin` seconds of expiry, callers keep getting the
+      current token while one refresh runs in the background.
+    - With `cache_path`, the token is written to (and first read from) a local JSON file, so
+      restarts and other workers reuse a still-valid token. Refreshes hold a lock on
+      `<cache_path>.lock`, so of several workers finding the token expired only one fetches
+      a new one and the others read it from the file. A saved token is only reused when
+      its `fingerprint` (e.g. a hash of the API key and host) matches, so changing either
+      fetches a new one.
+    - `refresh(force=True)` replaces a token the server rejected (e.g. answered 401).
+
+    `fetch` performs the token request and returns the endpoint's JSON
+    (`access_token`, `expires_in`).
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[dict]],
+        refresh_margin: float = 120,
+        cache_path: str | None = None,
+        fingerprint: str = '',
+    ):
+        self._fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.cache_path = cache_path or None
+        self.fingerprint = fingerprint
+        self.access_token = ''
+        self.expires_at = 0.0  # epoch seconds, comparable across processes
+        self._lock = asyncio.Lock()
+        self._background: asyncio.Task | None = None
+        self._load()
+
+    def _valid(self, margin: float = 0) -> bool:
+        return bool(self.access_token) and time.time() < self.expires_at - margin
+
+    async def get(self) -> str:
+        if self._valid(self.refresh_margin):
+            return self.access_token
+        if self._valid():
+            if self._background is None or self._background.done():
+                self._background = asyncio.create_task(self._refresh_in_background())
+            return self.access_token
+        return await self.refresh()
+
+    async def refresh(self, force: bool = False, rejected: str | None = None) -> str:
+        """Fetch a new token unless another caller (or worker) already did. With `rejected`, the
+        token a request failed with, a forced refresh is skipped once that token was replaced."""
+        async with self._lock, self._file_lock():
+            if rejected is not None and self.access_token != rejected and self._valid():
+                return self.access_token
+            if not force and self._valid(self.refresh_margin):
+                return self.access_token
+            expires_at = self.expires_at
+            self._load()
+            if self._valid(self.refresh_margin) and (not force or self.expires_at > expires_at):
+                return self.access_token  # another worker refreshed it while we waited
+            data = await self._fetch()
+            self.access_token = data['access_token']
+            self.expires_at = time.time() + float(data['expires_in'])
+            logger.info(f'access token refreshed, expires in {data["expires_in"]}s')
+            self._save()
+            return self.access_token
+
+    async def _refresh_in_background(self):
+        try:
+            await self.refresh()
+        except Exception as e:
+            logger.error(f'Fail refreshing access token ahead of expiry: {e}')
+
+    @contextlib.asynccontextmanager
+    async def _file_lock(self) -> AsyncIterator[None]:
+        if not self.cache_path or fcntl is None:
+            yield
+            return
+        try:
+            fd = os.open(f'{self.cache_path}.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        except OSError as e:
+            logger.warning(f'could not open token lock file: {e}')
+            yield
+            return
+        try:
+            await asyncio.to_thread(fcntl.flock, fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the lock
+
+    def _load(self) -> None:
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f'ignoring unreadable token cache {self.cache_path}: {e}')
+            return
+        if cached.get('fingerprint', '') != self.fingerprint:
+            return  # saved for another API key or host
+        if cached.get('expires_at', 0) > self.expires_at:
+            self.access_token = cached['access_token']
+            self.expires_at = cached['expires_at']
+
+    def _save(self) -> None:
+        if not self.cache_path:
+            return
+        tmp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'access_token': self.access_token, 'expires_at': self.expires_at,
+                           'fingerprint': self.fingerprint}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logger.warning(f'could not persist access token to {self.cache_path}: {e}')
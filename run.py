@@ -1,70 +1,82 @@
 import gradio as gr
-import json
 import openai
-import datetime
 import asyncio
-from fastmcp import Client
-from src.utils import llm_streaming_call, get_client, get_all_function_tools, tool_to_openai
-from src.prompt import base_prompt, tool_call_prompt
-import time
+from src.utils import async_llm_streaming_call, get_config, llm_client, ToolCatalogCache, SpeculativeToolCalls
+from src.mcp_session import MCPSessionPool
+from src.tracing import Trace
+from src.context_window import ContextBudget
+from src.prompt_cache import coarse_time, pin_context
+from src.prompt import base_prompt, context_prompt
 
 import logging
 logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s',datefmt = '%m/%d/%Y %I:%M:%S %p', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-client = get_client()
+config = get_config()
+mcp_pool = MCPSessionPool.from_config(config['mcp'])
+tool_catalog = ToolCatalogCache(ttl=config['mcp'].get('tool_catalog_ttl'))
+tool_catalog.watch(mcp_pool)
 
 def trans_chat_history(chat_histroy):
-    return [dd for dd in chat_histroy if dd['role'] in ['user', 'assistant'] and 'content' in dd]
+    # only what the chatbot shows; entries may also carry the content sent to the model
+    return [{'role': dd['role'], 'content': dd['content']} for dd in chat_histroy if dd['role'] in ['user', 'assistant'] and 'content' in dd]
 
 async def chat_by_tools(message, chat_history):
-    chat_history.append({'role': 'user', 'content': message})
-    async with Client("http://localhost:8000/mcp") as client_mcp:
-        function_name, function_id = '', ''
-        tool_body = ''
-        st_time = time.time()
-        tools = await client_mcp.list_tools()
-        tool_list_mcp = await get_all_function_tools([client_mcp], True)
-        logger.info(f'hand shaking : {time.time() - st_time}')
+    # read per turn, so edits to config.toml apply without a restart
+    config = get_config()
+    context_budget = ContextBudget.from_config(config.get('context', {}))
+    context = context_prompt.format(current_time=coarse_time(config.get('prompt_cache', {}).get('time_granularity', 'hour')))
+    # the message keeps the context it is first sent with, so later turns resend the same bytes
+    chat_history.append(pin_context({'role': 'user', 'content': message}, context))
+    turn = Trace('chat turn')
+    with turn.activate():
+        tool_list_mcp, tools = await tool_catalog.get_all(
+            [mcp_pool], True,
+            timeout=config['mcp'].get('discovery_timeout'),
+            on_duplicate=config['mcp'].get('tool_name_conflict', 'prefix'),
+        )
+    # tool calls start as soon as their arguments are complete, while the model still streams
+    tool_calls = SpeculativeToolCalls(
+        tool_list_mcp, timeout=config['mcp'].get('tool_timeout'),
+        mode=config['mcp'].get('tool_speculation', 'safe'), trace=turn,
+    )
 
-        tools = [tool_to_openai(tool) for tool in tool_list_mcp]
-        
-        for chunk in llm_streaming_call(client=client, system_prompt=base_prompt.format(current_time=datetime.datetime.now().isoformat()), messages=chat_history, tools=tools):
-            if chunk.choices[0].delta.tool_calls:
-                if chunk.choices[0].delta.tool_calls[0].id:
-                    function_id = chunk.choices[0].delta.tool_calls[0].id
-                if chunk.choices[0].delta.tool_calls[0].function.name:
-                    function_name =chunk.choices[0].delta.tool_calls[0].function.name
-                tool_body += chunk.choices[0].delta.tool_calls[0].function.arguments
+    async with llm_client() as client:
+        messages = context_budget.fit(chat_history, base_prompt, tools)
+        try:
+            async for chunk in async_llm_streaming_call(client=client, system_prompt=base_prompt, messages=messages, tools=tools, trace=turn):
+                if chunk.choices[0].delta.tool_calls:
+                    tool_calls.add(chunk.choices[0].delta.tool_calls)
 
-            if chunk.choices[0].delta.content:
-                if chat_history[-1]['role'] != 'assistant':
-                    chat_history.append({'role': 'assistant', 'content': chunk.choices[0].delta.content})
-                else:
-                    chat_history[-1]['content'] += chunk.choices[0].delta.content
-                yield trans_chat_history(chat_history), chat_history
-        logger.info(f'function name: {function_name}')
-        if function_name:
-            try:
-                tool_call = json.loads(tool_body)
-                logger.info(f'[tool] {function_name}, {function_id}, {tool_call}')
-                tool_result = ''
-                for t in tool_list_mcp:
-                    if t.name == function_name:
-                        tool_result = await t.on_invoke_tool(json.dumps(tool_call))
-                        logger.info(f'tool result: {t.name}, {tool_result}')
-                
-                chat_history.append({'role': 'assistant', 'tool_calls': [{'id': function_id, 'type': 'function', 'function':{'name': function_name, 'arguments': tool_body}}]})
-                chat_history.append({'role': 'tool', 'name': function_name, 'tool_call_id': function_id, 'content': json.dumps(tool_result, ensure_ascii=False)})
-            except:
-                pass
-            for tool_chunk in llm_streaming_call(client=client, system_prompt=tool_call_prompt.format(current_time=datetime.datetime.now().isoformat()), messages=chat_history):
+                if chunk.choices[0].delta.content:
+                    if chat_history[-1]['role'] != 'assistant':
+                        chat_history.append({'role': 'assistant', 'content': chunk.choices[0].delta.content})
+                    else:
+                        chat_history[-1]['content'] += chunk.choices[0].delta.content
+                    yield trans_chat_history(chat_history), chat_history
+        except BaseException:
+            tool_calls.cancel()
+            raise
+        logger.info(f"tool calls: {[tc['function']['name'] for tc in tool_calls.calls]}")
+        if tool_calls:
+            calls = tool_calls.calls
+            logger.info(f'[tool] {calls}')
+            chat_history.append({'role': 'assistant', 'tool_calls': calls})
+            with turn.activate():
+                chat_history.extend(await tool_calls.results())
+            # same system prompt and tools as the first call, so this request extends its cached
+            # prefix; `none` makes the model answer from the results instead of calling more tools
+            messages = context_budget.fit(chat_history, base_prompt, tools)
+            async for tool_chunk in async_llm_streaming_call(client=client, system_prompt=base_prompt, messages=messages, tools=tools, tool_choice='none', trace=turn):
                 if tool_chunk.choices[0].delta.content is not None:
                     if chat_history[-1]['role'] != 'assistant':
                         chat_history.append({'role':'assistant', "content":tool_chunk.choices[0].delta.content})
                     else:
                         chat_history[-1]['content'] += tool_chunk.choices[0].delta.content
                     yield trans_chat_history(chat_history), chat_history
+            # later turns resend these tool results exactly as this request did
+            context_budget.settle(chat_history, messages)
+    logger.info(turn.summary())
 
 def text_clean():
     return None
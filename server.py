@@ -1,5 +1,7 @@
 import httpx
+import uvicorn
 from fastmcp import FastMCP, Context
+import functools
 import os
 import datetime
 import requests
@@ -7,9 +9,14 @@ import json
 import logging
 from typing import Optional, Annotated
 from pydantic import Field
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
 from mcp_tool.amadeus_tool import (
     amadeus_tools
 )
+from mcp_tool.scheduler import ToolScheduler
+from src.utils import get_config
+from src.tracing import metrics, span
 logging.basicConfig(format='%(asctime)s:%(levelname)s:%(message)s',datefmt = '%m/%d/%Y %I:%M:%S %p', level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -19,6 +26,44 @@ mcp = FastMCP(name='test')
 def get_version():
     return "2.3.3"
 
+@mcp.resource("stats://amadeus-cache")
+def get_amadeus_cache_stats():
+    return json.dumps({**at.cache.stats(), 'coalesced': at.inflight.stats()})
+
+@mcp.resource("stats://tool-scheduler")
+def get_tool_scheduler_stats():
+    return json.dumps(scheduler.stats())
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def prometheus_metrics(request: Request) -> PlainTextResponse:
+    """Span latency histograms, error counts and Amadeus cache hit rates (Prometheus text format)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+def amadeus_cache_samples():
+    stats = at.cache.stats()
+    samples = [
+        ('amadeus_cache_hit_rate', 'gauge', 'Share of Amadeus response lookups served from cache.', {}, stats['hit_rate']),
+        ('amadeus_cache_entries', 'gauge', 'Responses held in the in-memory cache.', {}, stats['memory_entries']),
+    ]
+    for endpoint, counts in stats['endpoints'].items():
+        for result, count in counts.items():
+            samples.append(('amadeus_cache_lookups_total', 'counter', 'Amadeus response cache lookups.',
+                            {'endpoint': endpoint, 'result': result}, count))
+    for key, value in at.inflight.stats().items():
+        samples.append(('amadeus_coalesced_requests', 'gauge', 'Upstream requests started, shared by concurrent callers, and in flight.',
+                        {'kind': key}, value))
+    return samples
+
+def traced_tool(fn):
+    """Record each call of an MCP tool as span `mcp.tool` (queue wait included) and run it
+    through the scheduler's concurrency, queue and deadline limits."""
+    scheduled = scheduler.wrap(fn)
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        with span('mcp.tool', tool=fn.__name__):
+            return await scheduled(*args, **kwargs)
+    return wrapper
+
 @mcp.prompt()
 def ask_name_prompt(prompt: str) -> str:
     return f"what's your name? {prompt}"
@@ -46,14 +91,52 @@ async def summarize(uri: str, ctx: Context):
         page = await client.get(uri)
     return page.text 
 
-at = amadeus_tools()
-mcp.add_tool(at.search_fligiht)
-mcp.add_tool(at.list_hotel_by_city)
-mcp.add_tool(at.search_flight_by_origin)
-mcp.add_tool(at.search_hotel_offer)
+config = get_config()
+server_config = config.get('server', {})
+workers = server_config.get('workers', 1)
+amadeus_config = dict(config.get('amadeus', {}))
+if workers > 1:
+    # every worker is its own process: share the OAuth token, cached responses and the rate
+    # limit through local files, and keep no session state so any worker can serve any request
+    amadeus_config['token_cache_path'] = amadeus_config.get('token_cache_path') or '.amadeus_token.json'
+    amadeus_config['cache_sqlite_path'] = amadeus_config.get('cache_sqlite_path') or '.amadeus_cache.sqlite3'
+    amadeus_config['rate_limit_path'] = amadeus_config.get('rate_limit_path') or '.amadeus_rate_limit.json'
+mcp.settings.stateless_http = server_config.get('stateless_http', workers > 1)
+at = amadeus_tools(**amadeus_config)
+scheduler = ToolScheduler.from_config(config.get('scheduler', {}))
+metrics.register_collector(amadeus_cache_samples)
+metrics.register_collector(scheduler.samples)
+# Amadeus searches only read; clients may cache their results (see `[mcp] tool_result_cache`)
+amadeus_annotations = {'readOnlyHint': True, 'idempotentHint': True, 'openWorldHint': True}
+mcp.add_tool(traced_tool(at.search_fligiht), annotations=amadeus_annotations)
+mcp.add_tool(traced_tool(at.list_hotel_by_city), annotations=amadeus_annotations)
+mcp.add_tool(traced_tool(at.search_flight_by_origin), annotations=amadeus_annotations)
+mcp.add_tool(traced_tool(at.search_hotel_offer), annotations=amadeus_annotations)
+
+def create_app():
+    """Streamable-HTTP app of one worker (`uvicorn server:create_app --factory`)."""
+    return mcp.http_app(path=server_config.get('path', "/mcp"))
 
 if __name__ == "__main__":
     # mcp.run()
     # mcp.run(transport="stdio")  # Default, so transport argument is optional
-    mcp.run(transport="streamable-http", host="127.0.0.1", port=8000, path="/mcp")
+    if workers > 1:
+        # uvicorn starts the workers and spreads connections over them; each imports this module
+        logger.info(f'starting {workers} workers')
+        uvicorn.run(
+            "server:create_app",
+            factory=True,
+            workers=workers,
+            host=server_config.get('host', "127.0.0.1"),
+            port=server_config.get('port', 8000),
+            lifespan="on",
+            timeout_graceful_shutdown=0,
+        )
+    else:
+        mcp.run(
+            transport="streamable-http",
+            host=server_config.get('host', "127.0.0.1"),
+            port=server_config.get('port', 8000),
+            path=server_config.get('path', "/mcp"),
+        )
     # mcp.run(transport="sse", host="127.0.0.1", port=8000)
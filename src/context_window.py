@@ -0,0 +1,198 @@
+import functools
+import json
+import logging
+from typing import Any
+
+from src.prompt_cache import SENT_CONTENT
+
+try:
+    import tiktoken
+except ImportError:  # optional; token counts are estimated without it
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+MESSAGE_OVERHEAD_TOKENS = 4  # role and separators per message
+TRUNCATED_MARKER = '…[truncated {n} tokens]'
+
+
+@functools.lru_cache(maxsize=8)
+def _encoding(name: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(name)
+    except Exception as e:  # unknown name, or the BPE file cannot be fetched
+        logger.warning(f'tiktoken encoding {name} unavailable, estimating token counts: {e}')
+        return None
+
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens(text: str, encoding: str = 'o200k_base') -> int:
+    """Tokens in `text`: exact with tiktoken, otherwise a conservative estimate
+    (4 ASCII characters or 1 other character per token, so Korean text is not undercounted)."""
+    if not text:
+        return 0
+    enc = _encoding(encoding)
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    ascii_chars = sum(1 for c in text if c.isascii())
+    return -(-ascii_chars // 4) + len(text) - ascii_chars
+
+
+def truncate_tokens(text: str, max_tokens: int, encoding: str = 'o200k_base') -> str:
+    """`text` cut to about `max_tokens` tokens, with a marker saying how much was dropped."""
+    total = count_tokens(text, encoding)
+    if total <= max_tokens:
+        return text
+    enc = _encoding(encoding)
+    if enc is not None:
+        head = enc.decode(enc.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        # longest prefix within the estimate used by `count_tokens`
+        cost, end = 0.0, 0
+        for end, c in enumerate(text):
+            cost += 0.25 if c.isascii() else 1
+            if cost > max_tokens:
+                break
+        head = text[:end]
+    return head + TRUNCATED_MARKER.format(n=total - max_tokens)
+
+
+class ContextBudget:
+    """Keeps the messages sent to the model under `max_tokens`.
+
+    `fit(chat_history)` returns a new list and never modifies the history (the UI keeps
+    showing everything). It:
+
+    1. truncates tool results of the latest turn to `max_tool_tokens` (less if that turn
+       alone is over budget, down to `history_tool_tokens`);
+    2. drops the oldest turns until the rest fits, replacing them with one short extractive
+       summary (their questions, answers and tools used, at most `summary_tokens`).
+
+    A turn starts at a user message, so an assistant `tool_calls` message is always kept or
+    dropped together with its `tool` results. The latest turn is always kept.
+
+    Once a turn has ended, `settle` records its tool results as last sent on the history
+    entries, and `fit` never truncates those again, so a message sent once is byte-identical
+    in every later request and the prompt cache keeps hitting. Tool results of a turn that
+    ended before it was settled are cut to `history_tool_tokens`.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 24000,
+        max_tool_tokens: int = 4000,
+        history_tool_tokens: int = 500,
+        summary_tokens: int = 600,
+        encoding: str = 'o200k_base',
+    ):
+        self.max_tokens = max_tokens
+        self.max_tool_tokens = max_tool_tokens
+        self.history_tool_tokens = history_tool_tokens
+        self.summary_tokens = summary_tokens
+        self.encoding = encoding
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any]) -> "ContextBudget":
+        keys = ('max_tokens', 'max_tool_tokens', 'history_tool_tokens', 'summary_tokens', 'encoding')
+        return cls(**{key: config[key] for key in keys if key in config})
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.encoding)
+
+    def message_tokens(self, message: dict) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS + self.count(message.get(SENT_CONTENT) or message.get('content') or '')
+        for call in message.get('tool_calls') or []:
+            function = call.get('function', {})
+            tokens += self.count(function.get('name', '')) + self.count(function.get('arguments', ''))
+        return tokens
+
+    def tools_tokens(self, tools: list | None) -> int:
+        return self.count(json.dumps(tools, ensure_ascii=False)) if tools else 0
+
+    @staticmethod
+    def turns(messages: list[dict]) -> list[list[dict]]:
+        """Messages grouped into turns, each starting at a user message."""
+        turns = []
+        for message in messages:
+            if message.get('role') == 'user' or not turns:
+                turns.append([])
+            turns[-1].append(message)
+        return turns
+
+    def _truncate_tools(self, turn: list[dict], max_tokens: int) -> list[dict]:
+        return [
+            {**m, 'content': truncate_tokens(m['content'], max_tokens, self.encoding)}
+            if m.get('role') == 'tool' and isinstance(m.get('content'), str) and SENT_CONTENT not in m else m
+            for m in turn
+        ]
+
+    @staticmethod
+    def settle(messages: list[dict], sent: list[dict]) -> None:
+        """Pin the tool results in `messages` (the history) to their content in `sent` (what
+        `fit` returned for the turn's last request), under `SENT_CONTENT`."""
+        sent_content = {m.get('tool_call_id'): m['content'] for m in sent if m.get('role') == 'tool'}
+        for m in messages:
+            if m.get('role') == 'tool' and SENT_CONTENT not in m and m.get('tool_call_id') in sent_content:
+                m[SENT_CONTENT] = sent_content[m['tool_call_id']]
+
+    def _summary(self, dropped: list[list[dict]]) -> dict | None:
+        lines = []
+        for turn in dropped:
+            question = next((m.get('content') for m in turn if m.get('role') == 'user'), '') or ''
+            answer = next((m.get('content') for m in reversed(turn)
+                           if m.get('role') == 'assistant' and m.get('content')), '') or ''
+            tools = sorted({c['function']['name'] for m in turn for c in m.get('tool_calls') or []})
+            line = f'- user: {truncate_tokens(question, 60, self.encoding)}'
+            if tools:
+                line += f" (tools: {', '.join(tools)})"
+            if answer:
+                line += f'\n  assistant: {truncate_tokens(answer, 80, self.encoding)}'
+            lines.append(line)
+        header = 'Summary of the earlier conversation (older turns were removed to save context):'
+        # newest dropped turns matter most; drop the oldest lines until the summary fits
+        while lines and self.count('\n'.join([header, *lines])) > self.summary_tokens:
+            lines.pop(0)
+        if not lines:
+            return None
+        return {'role': 'system', 'content': '\n'.join([header, *lines])}
+
+    def fit(self, messages: list[dict], system_prompt: str = '', tools: list | None = None) -> list[dict]:
+        """Messages to send so that they, `system_prompt` and `tools` stay within `max_tokens`."""
+        turns = self.turns(messages)
+        if not turns:
+            return []
+        turns = [self._truncate_tools(turn, self.history_tool_tokens) for turn in turns[:-1]] + \
+            [self._truncate_tools(turns[-1], self.max_tool_tokens)]
+        budget = self.max_tokens - self.count(system_prompt) - self.tools_tokens(tools)
+        sizes = [sum(self.message_tokens(m) for m in turn) for turn in turns]
+
+        kept_from = 0
+        while kept_from < len(turns) - 1 and sum(sizes[kept_from:]) > budget:
+            kept_from += 1
+        summary = None
+        if kept_from:
+            summary = self._summary(turns[:kept_from])
+            if summary is not None:
+                # make room for the summary itself
+                while kept_from < len(turns) - 1 and \
+                        sum(sizes[kept_from:]) + self.message_tokens(summary) > budget:
+                    kept_from += 1
+                summary = self._summary(turns[:kept_from])
+        kept = [m for turn in turns[kept_from:] for m in turn]
+        fitted = ([summary] if summary else []) + kept
+
+        total = sum(self.message_tokens(m) for m in fitted)
+        limit = self.max_tool_tokens
+        while total > budget and limit > self.history_tool_tokens:
+            # only the latest turn is left and it is still too big: shrink its tool results
+            # further (older turns are already at `history_tool_tokens`)
+            limit = max(self.history_tool_tokens, limit // 2)
+            fitted = ([summary] if summary else []) + self._truncate_tools(kept, limit)
+            total = sum(self.message_tokens(m) for m in fitted)
+        if kept_from:
+            logger.info(f'context budget: dropped {kept_from} of {len(turns)} turns, {total}/{budget} tokens')
+        if total > budget:
+            logger.warning(f'context budget: latest turn alone is {total} tokens, over the budget of {budget}')
+        return fitted
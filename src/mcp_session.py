@@ -0,0 +1,220 @@
+import asyncio
+import contextlib
+import contextvars
+import datetime
+import logging
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable
+
+import mcp.types
+from fastmcp import Client
+from fastmcp.client.transports import ClientTransport
+
+from src.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Slot:
+    index: int
+    client: Client | None = None
+    wake: asyncio.Event = field(default_factory=asyncio.Event)
+
+
+class MCPSessionPool:
+    """Long-lived MCP sessions shared by every chat.
+
+    Each slot owns one `fastmcp.Client` for its whole lifetime: the slot task opens the
+    session, keeps it healthy with periodic pings and reconnects with backoff when the
+    connection drops. Chats borrow an idle session with `session()` and give it back when
+    they are done, so the initialize handshake is paid once per slot instead of per message.
+
+    The pool also exposes `list_tools` and `call_tool`, so it can be handed anywhere a
+    connected `Client` is expected (e.g. `get_all_function_tools`).
+    """
+
+    def __init__(
+        self,
+        target: ClientTransport | str,
+        size: int = 4,
+        connect_timeout: float = 10.0,
+        acquire_timeout: float = 30.0,
+        health_check_interval: float = 30.0,
+        reconnect_backoff: float = 1.0,
+        max_reconnect_backoff: float = 30.0,
+        read_timeout: float | None = None,
+        name: str | None = None,
+    ):
+        self.target = target
+        self.name = name or str(target)
+        self.size = max(1, size)
+        self.connect_timeout = connect_timeout
+        self.acquire_timeout = acquire_timeout
+        self.health_check_interval = health_check_interval
+        self.reconnect_backoff = reconnect_backoff
+        self.max_reconnect_backoff = max_reconnect_backoff
+        self.read_timeout = read_timeout
+
+        self._slots: list[_Slot] = []
+        self._tasks: list[asyncio.Task] = []
+        self._idle: asyncio.Queue[Client] | None = None
+        self._live: dict[int, _Slot] = {}  # id(client) -> slot, only for connected clients
+        self._ready: asyncio.Event | None = None
+        self._start_lock = asyncio.Lock()
+        self._closed = False
+        self._tools_changed_listeners: list[Callable[[], None]] = []
+
+    @classmethod
+    def from_config(cls, config: dict[str, Any], target: ClientTransport | str | None = None) -> "MCPSessionPool":
+        """Build a pool from the `[mcp]` table of config.toml."""
+        return cls(
+            target=target or config["url"],
+            size=config.get("pool_size", 4),
+            connect_timeout=config.get("connect_timeout", 10.0),
+            acquire_timeout=config.get("acquire_timeout", 30.0),
+            health_check_interval=config.get("health_check_interval", 30.0),
+            reconnect_backoff=config.get("reconnect_backoff", 1.0),
+            max_reconnect_backoff=config.get("max_reconnect_backoff", 30.0),
+            read_timeout=config.get("read_timeout"),
+            name=config.get("name"),
+        )
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Open the sessions. Safe to call repeatedly; only the first call connects.
+
+        Must be awaited on the event loop that will use the pool (the MCP transports are
+        bound to the task that opened them).
+        """
+        if self._tasks:
+            return
+        async with self._start_lock:
+            if self._tasks:
+                return
+            self._closed = False
+            self._idle = asyncio.Queue()
+            self._ready = asyncio.Event()
+            self._slots = [_Slot(index=i) for i in range(self.size)]
+            # fresh contexts: long-lived slot tasks must not inherit the trace of the turn that started them
+            self._tasks = [
+                asyncio.create_task(self._run_slot(slot), context=contextvars.Context()) for slot in self._slots
+            ]
+            try:
+                async with asyncio.timeout(self.connect_timeout):
+                    await self._ready.wait()
+            except TimeoutError:
+                logger.warning(f'MCP pool {self.name}: no session ready after {self.connect_timeout}s, still retrying')
+
+    async def close(self) -> None:
+        self._closed = True
+        for slot in self._slots:
+            slot.wake.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._slots = []
+        self._live.clear()
+
+    @contextlib.asynccontextmanager
+    async def session(self) -> AsyncIterator[Client]:
+        """Borrow a connected session for the duration of the block."""
+        with span('mcp.acquire', server=self.name):
+            await self.start()
+            async with asyncio.timeout(self.acquire_timeout):
+                while True:
+                    client = await self._idle.get()
+                    if id(client) in self._live:
+                        break
+        try:
+            yield client
+        except Exception:
+            # Let the owning slot verify the connection right away instead of waiting for the
+            # next periodic health check.
+            self._suspect(client)
+            raise
+        finally:
+            if id(client) in self._live:
+                self._idle.put_nowait(client)
+
+    async def list_tools(self):
+        async with self.session() as client:
+            with span('mcp.list_tools', server=self.name):
+                return await client.list_tools()
+
+    async def call_tool(self, name: str, arguments: dict[str, Any] | None = None):
+        async with self.session() as client:
+            with span('mcp.call_tool', server=self.name, tool=name):
+                return await client.call_tool(name, arguments)
+
+    def add_tools_changed_listener(self, callback: Callable[[], None]) -> None:
+        """Call `callback` whenever the server sends `notifications/tools/list_changed`."""
+        self._tools_changed_listeners.append(callback)
+
+    async def _handle_message(self, message) -> None:
+        if isinstance(message, mcp.types.ServerNotification) and \
+            isinstance(message.root, mcp.types.ToolListChangedNotification):
+            logger.info(f'MCP pool {self.name}: tool list changed')
+            for callback in self._tools_changed_listeners:
+                callback()
+
+    def _suspect(self, client: Client) -> None:
+        slot = self._live.get(id(client))
+        if slot is not None:
+            slot.wake.set()
+
+    def _new_client(self) -> Client:
+        read_timeout = datetime.timedelta(seconds=self.read_timeout) if self.read_timeout else None
+        return Client(self.target, message_handler=self._handle_message, read_timeout_seconds=read_timeout)
+
+    async def _run_slot(self, slot: _Slot) -> None:
+        delay = self.reconnect_backoff
+        while not self._closed:
+            client = self._new_client()
+            try:
+                async with contextlib.AsyncExitStack() as stack:
+                    with span('mcp.connect', server=self.name):
+                        async with asyncio.timeout(self.connect_timeout):
+                            await stack.enter_async_context(client)
+                    logger.info(f'MCP pool {self.name}: session {slot.index} connected')
+                    delay = self.reconnect_backoff
+                    slot.client = client
+                    slot.wake.clear()
+                    self._live[id(client)] = slot
+                    self._idle.put_nowait(client)
+                    self._ready.set()
+                    await self._watch(slot, client)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f'MCP pool {self.name}: session {slot.index} failed: {e!r}')
+            finally:
+                self._live.pop(id(client), None)
+                slot.client = None
+            if self._closed:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_backoff)
+
+    async def _watch(self, slot: _Slot, client: Client) -> None:
+        """Ping the session periodically (or when a borrower saw an error) until it fails."""
+        while not self._closed:
+            try:
+                if self.health_check_interval:
+                    async with asyncio.timeout(self.health_check_interval):
+                        await slot.wake.wait()
+                else:
+                    await slot.wake.wait()
+            except TimeoutError:
+                pass
+            slot.wake.clear()
+            if self._closed:
+                return
+            with span('mcp.ping', server=self.name):
+                async with asyncio.timeout(self.connect_timeout):
+                    if not await client.ping():
+                        raise ConnectionError('ping got an unexpected answer')
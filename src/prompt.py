@@ -1,21 +1,18 @@
+# System prompts are kept free of volatile values so the request prefix stays byte-stable and
+# the provider's prompt cache can hit; the current time goes into `context_prompt`, which is
+# stored with each user message when it is first sent (see `pin_context` in src/prompt_cache.py).
+# Both calls of a turn (tool selection and the answer from tool results) send `base_prompt`
+# and the same tools, so the second call extends the first one's cached prefix.
 base_prompt="""
 <role>
 - You answer kindly.
 - You are trip advisor(flight, hotel only).
+- With tool results, generate a response including them to show the user, easy to see.
 </role>
-
-<context>
-- current time: {current_time}
-</context>
 """
 
-tool_call_prompt="""
-<role>
-- Generate response including tool result to show user.
-- You gather information and make response easy to see for user.
-</role>
-
+context_prompt="""
 <context>
 - current time: {current_time}
 </context>
-"""
\ No newline at end of file
+"""
@@ -0,0 +1,105 @@
+import datetime
+import logging
+from typing import Any
+
+logger = logging.getLogger(__name__)
+
+CACHE_CONTROL = {'type': 'ephemeral'}
+# key of a history entry holding its content exactly as it was first sent; later requests
+# resend that instead of deriving it again, so the prefix stays byte-identical
+SENT_CONTENT = 'sent_content'
+TIME_FORMATS = {
+    'day': '%Y-%m-%d',
+    'hour': '%Y-%m-%d %H:00',
+    'minute': '%Y-%m-%d %H:%M',
+}
+
+
+def coarse_time(granularity: str = 'hour', now: datetime.datetime | None = None) -> str:
+    """Current local time rounded down to `granularity` (day, hour or minute), with its UTC
+    offset, so the context block only changes when the time visibly does."""
+    now = (now or datetime.datetime.now()).astimezone()
+    return f"{now.strftime(TIME_FORMATS[granularity])} {now.strftime('%z')}"
+
+
+def supports_cache_control(model: str, mode: str = 'auto') -> bool:
+    """Whether to send Anthropic-style `cache_control` breakpoints. `auto` sends them to Claude
+    models only; OpenAI models cache prefixes automatically and may reject unknown fields."""
+    if mode in ('always', 'never'):
+        return mode == 'always'
+    return 'claude' in model.lower() or model.lower().startswith('anthropic/')
+
+
+def _with_breakpoint(message: dict) -> dict:
+    content = message['content']
+    if isinstance(content, str):
+        content = [{'type': 'text', 'text': content}]
+    *head, last = content
+    return {**message, 'content': [*head, {**last, 'cache_control': CACHE_CONTROL}]}
+
+
+def _as_sent(message: dict) -> dict:
+    if SENT_CONTENT not in message:
+        return message
+    sent = {key: value for key, value in message.items() if key != SENT_CONTENT}
+    sent['content'] = message[SENT_CONTENT]
+    return sent
+
+
+def _with_context(message: dict, context: str) -> dict:
+    content = message.get('content') or ''
+    if isinstance(content, str):
+        return {**message, 'content': f'{content}\n{context}'}
+    return {**message, 'content': [*content, {'type': 'text', 'text': context}]}
+
+
+def pin_context(message: dict, context: str) -> dict:
+    """A new user `message` whose sent content (`SENT_CONTENT`) carries the volatile `context`
+    (e.g. the current time). Keep the result in the history: later turns then resend the
+    message with the context it was first sent with, instead of without or with a newer one."""
+    return {**message, SENT_CONTENT: _with_context(message, context)['content']}
+
+
+def layout_messages(
+    system_prompt: str,
+    messages: list[dict[str, Any]],
+    cache_control: bool = False,
+) -> list[dict[str, Any]]:
+    """Messages ordered for prefix caching: the static system prompt, then the history as
+    first sent (messages carrying `SENT_CONTENT` are sent with that content).
+
+    As long as the system prompt and tools stay the same and history entries keep their
+    `SENT_CONTENT` (see `pin_context` and `ContextBudget.settle`), everything before the
+    latest user message is byte-identical to what the previous turn sent, so it is a cache
+    hit. With `cache_control`, breakpoints mark the end of the system prompt (which also
+    covers the tool definitions) and the end of that stable history. `messages` is not
+    modified.
+    """
+    messages = [_as_sent(m) for m in messages]
+    last_user = next((i for i in range(len(messages) - 1, -1, -1) if messages[i].get('role') == 'user'), None)
+    if cache_control and last_user:
+        # the last message with text before the latest user message; tool_calls-only
+        # assistant messages have no content block to carry the breakpoint
+        stable = next((i for i in range(last_user - 1, -1, -1) if messages[i].get('content')
+                       and messages[i].get('role') in ('user', 'assistant', 'system')), None)
+        if stable is not None:
+            messages[stable] = _with_breakpoint(messages[stable])
+    if not system_prompt:
+        return messages
+    system = {'role': 'system', 'content': system_prompt}
+    return [_with_breakpoint(system) if cache_control else system] + messages
+
+
+def usage_summary(usage) -> dict[str, int]:
+    """Prompt, cached and completion token counts from a chat completion `usage`, whichever of
+    the OpenAI (`prompt_tokens_details.cached_tokens`) or Anthropic-style
+    (`cache_read_input_tokens`, `cache_creation_input_tokens`) fields the provider returns."""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    extra = getattr(usage, 'model_extra', None) or {}
+    cached = getattr(details, 'cached_tokens', None) or extra.get('cache_read_input_tokens') or 0
+    return {
+        'prompt': usage.prompt_tokens or 0,
+        'cached': cached,
+        'cache_write': extra.get('cache_creation_input_tokens') or 0,
+        'completion': usage.completion_tokens or 0,
+    }
@@ -1,3 +1,7 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
 from typing import Any
 
 from openai import NOT_GIVEN
@@ -10,27 +14,40 @@ _EMPTY_SCHEMA = {
     "required": [],
 }
 
+# converted schemas by content hash; MCP servers list the same schemas on every reload
+STRICT_SCHEMA_CACHE_SIZE = 1024
+_strict_cache: OrderedDict[str, dict[str, Any]] = OrderedDict()
+_strict_cache_lock = threading.Lock()
+
 # Adapted from https://github.com/openai/openai-python/blob/main/src/openai/lib/_pydantic.py
 def _ensure_strict_json_schema(
     json_schema: object,
     *,
     path: tuple[str, ...],
     root: dict[str, object],
+    refs: dict[str, object],
 ) -> dict[str, Any]:
+    """Copy-on-write: returns a new dict for every schema node and never modifies
+    `json_schema` or `root`. `refs` caches `$ref` resolutions against `root`."""
     if not is_dict(json_schema):
         raise TypeError(f"Expected {json_schema} to be a dictionary; path={path}")
+    json_schema = dict(json_schema)
 
     defs = json_schema.get("$defs")
     if is_dict(defs):
-        for def_name, def_schema in defs.items():
-            _ensure_strict_json_schema(def_schema, path=(*path, "$defs", def_name), root=root)
+        json_schema["$defs"] = {
+            def_name: _ensure_strict_json_schema(def_schema, path=(*path, "$defs", def_name), root=root, refs=refs)
+            for def_name, def_schema in defs.items()
+        }
 
     definitions = json_schema.get("definitions")
     if is_dict(definitions):
-        for definition_name, definition_schema in definitions.items():
-            _ensure_strict_json_schema(
-                definition_schema, path=(*path, "definitions", definition_name), root=root
+        json_schema["definitions"] = {
+            definition_name: _ensure_strict_json_schema(
+                definition_schema, path=(*path, "definitions", definition_name), root=root, refs=refs
             )
+            for definition_name, definition_schema in definitions.items()
+        }
 
     typ = json_schema.get("type")
     if typ == "object" and "additionalProperties" not in json_schema:
@@ -53,7 +70,7 @@ def _ensure_strict_json_schema(
     if is_dict(properties):
         json_schema["required"] = list(properties.keys())
         json_schema["properties"] = {
-            key: _ensure_strict_json_schema(prop_schema, path=(*path, "properties", key), root=root)
+            key: _ensure_strict_json_schema(prop_schema, path=(*path, "properties", key), root=root, refs=refs)
             for key, prop_schema in properties.items()
         }
 
@@ -61,13 +78,13 @@ def _ensure_strict_json_schema(
     # { 'type': 'array', 'items': {...} }
     items = json_schema.get("items")
     if is_dict(items):
-        json_schema["items"] = _ensure_strict_json_schema(items, path=(*path, "items"), root=root)
+        json_schema["items"] = _ensure_strict_json_schema(items, path=(*path, "items"), root=root, refs=refs)
 
     # unions
     any_of = json_schema.get("anyOf")
     if is_list(any_of):
         json_schema["anyOf"] = [
-            _ensure_strict_json_schema(variant, path=(*path, "anyOf", str(i)), root=root)
+            _ensure_strict_json_schema(variant, path=(*path, "anyOf", str(i)), root=root, refs=refs)
             for i, variant in enumerate(any_of)
         ]
 
@@ -76,12 +93,12 @@ def _ensure_strict_json_schema(
     if is_list(all_of):
         if len(all_of) == 1:
             json_schema.update(
-                _ensure_strict_json_schema(all_of[0], path=(*path, "allOf", "0"), root=root)
+                _ensure_strict_json_schema(all_of[0], path=(*path, "allOf", "0"), root=root, refs=refs)
             )
             json_schema.pop("allOf")
         else:
             json_schema["allOf"] = [
-                _ensure_strict_json_schema(entry, path=(*path, "allOf", str(i)), root=root)
+                _ensure_strict_json_schema(entry, path=(*path, "allOf", str(i)), root=root, refs=refs)
                 for i, entry in enumerate(all_of)
             ]
 
@@ -100,18 +117,20 @@ def _ensure_strict_json_schema(
     if ref and has_more_than_n_keys(json_schema, 1):
         assert isinstance(ref, str), f"Received non-string $ref - {ref}"
 
-        resolved = resolve_ref(root=root, ref=ref)
+        resolved = refs.get(ref)
+        if resolved is None:
+            resolved = refs[ref] = resolve_ref(root=root, ref=ref)
         if not is_dict(resolved):
             raise ValueError(
                 f"Expected `$ref: {ref}` to resolved to a dictionary but got {resolved}"
             )
 
         # properties from the json schema take priority over the ones on the `$ref`
-        json_schema.update({**resolved, **json_schema})
+        json_schema = {**resolved, **json_schema}
         json_schema.pop("$ref")
         # Since the schema expanded from `$ref` might not have `additionalProperties: false` applied
         # we call `_ensure_strict_json_schema` again to fix the inlined schema and ensure it's valid
-        return _ensure_strict_json_schema(json_schema, path=path, root=root)
+        return _ensure_strict_json_schema(json_schema, path=path, root=root, refs=refs)
 
     return json_schema
 
@@ -152,9 +171,31 @@ def has_more_than_n_keys(obj: dict[str, object], n: int) -> bool:
 def ensure_strict_json_schema(
     schema: dict[str, Any],
 ) -> dict[str, Any]:
-    """Mutates the given JSON schema to ensure it conforms to the `strict` standard
-    that the OpenAI API expects.
+    """Returns a copy of the given JSON schema that conforms to the `strict` standard
+    that the OpenAI API expects; `schema` itself is left untouched.
+
+    Results are memoized by content hash, so identical schemas (e.g. the same tools listed
+    again after a reload) are converted once. The returned schema is shared between callers
+    and must be treated as read-only.
     """
     if schema == {}:
         return _EMPTY_SCHEMA
-    return _ensure_strict_json_schema(schema, path=(), root=schema)
\ No newline at end of file
+    key = hashlib.sha256(
+        json.dumps(schema, sort_keys=True, separators=(",", ":"), default=str).encode()
+    ).hexdigest()
+    with _strict_cache_lock:
+        cached = _strict_cache.get(key)
+        if cached is not None:
+            _strict_cache.move_to_end(key)
+            return cached
+    converted = _ensure_strict_json_schema(schema, path=(), root=schema, refs={})
+    with _strict_cache_lock:
+        _strict_cache[key] = converted
+        while len(_strict_cache) > STRICT_SCHEMA_CACHE_SIZE:
+            _strict_cache.popitem(last=False)
+    return converted
+
+
+def clear_strict_schema_cache() -> None:
+    with _strict_cache_lock:
+        _strict_cache.clear()
@@ -29,4 +29,8 @@ class FunctionTool:
 
     strict_json_schema: bool = True
     """Whether the JSON schema is in strict mode. We **strongly** recommend setting this to True,
-    as it increases the likelihood of correct JSON input."""
\ No newline at end of file
+    as it increases the likelihood of correct JSON input."""
+
+    annotations: Any = None
+    """MCP tool annotations (`readOnlyHint`, `idempotentHint`, ...) when the tool comes from an
+    MCP server, used to decide whether it is safe to start a call speculatively."""
\ No newline at end of file
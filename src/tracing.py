@@ -0,0 +1,181 @@
+import bisect
+import contextlib
+import contextvars
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Iterator
+
+logger = logging.getLogger(__name__)
+
+# seconds; Prometheus defaults plus the long tail of LLM streams and slow provider calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_current_trace: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar('current_trace', default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class Metrics:
+    """Process-wide span histograms and error counters, rendered in the Prometheus text format.
+
+    Every finished span is observed in `span_duration_seconds{span=...}` and, when it failed,
+    counted in `span_errors_total{span=...,error=...}`. `increment` counts other events (e.g.
+    LLM tokens), and other modules can add values computed at scrape time (e.g. cache hit
+    rates) with `register_collector`.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # (span, labels) -> [bucket counts..., +Inf count], sum
+        self._histograms: dict[tuple, list] = {}
+        self._errors: dict[tuple, int] = defaultdict(int)
+        self._counters: dict[tuple, float] = defaultdict(float)
+        self._collectors: list[Callable[[], list[tuple[str, str, str, dict, float]]]] = []
+
+    def observe(self, name: str, seconds: float, labels: dict[str, str], error: str | None = None) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            histogram[0][bisect.bisect_left(self.buckets, seconds)] += 1
+            histogram[1] += seconds
+            if error:
+                self._errors[(*key, error)] += 1
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Add `value` to counter `name` (rendered as is, so name it `..._total`)."""
+        key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def register_collector(self, collector: Callable[[], list[tuple[str, str, str, dict, float]]]) -> None:
+        """`collector()` returns `(metric, type, help, labels, value)` samples at scrape time."""
+        self._collectors.append(collector)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        lines = [
+            '# HELP span_duration_seconds Duration of traced phases.',
+            '# TYPE span_duration_seconds histogram',
+        ]
+        with self._lock:
+            histograms = {key: ([*counts], total) for key, (counts, total) in self._histograms.items()}
+            errors = dict(self._errors)
+            counters = dict(self._counters)
+        for (name, labels), (counts, total) in sorted(histograms.items()):
+            labels = {'span': name, **dict(labels)}
+            cumulative = 0
+            for bound, count in zip((*self.buckets, math.inf), counts):
+                cumulative += count
+                le = '+Inf' if bound == math.inf else repr(bound)
+                lines.append(f'span_duration_seconds_bucket{_labels({**labels, "le": le})} {cumulative}')
+            lines.append(f'span_duration_seconds_sum{_labels(labels)} {total}')
+            lines.append(f'span_duration_seconds_count{_labels(labels)} {cumulative}')
+        lines += ['# HELP span_errors_total Traced phases that raised or failed.', '# TYPE span_errors_total counter']
+        for (name, labels, error), count in sorted(errors.items()):
+            lines.append(f'span_errors_total{_labels({"span": name, **dict(labels), "error": error})} {count}')
+
+        declared = set()
+        for (name, labels), value in sorted(counters.items()):
+            if name not in declared:
+                declared.add(name)
+                lines.append(f'# TYPE {name} counter')
+            lines.append(f'{name}{_labels(dict(labels))} {value:g}')
+        for collector in self._collectors:
+            try:
+                samples = collector()
+            except Exception as e:
+                logger.warning(f'metrics collector failed: {e}')
+                continue
+            for metric, kind, help_text, labels, value in samples:
+                if metric not in declared:
+                    declared.add(metric)
+                    lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} {kind}']
+                lines.append(f'{metric}{_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class Trace:
+    """Spans of one unit of work (e.g. one chat turn), to see where a slow one spent its time.
+
+    Spans finished while the trace is active (`activate()`), or recorded with `trace=`, are
+    collected in `spans`; `summary()` renders them as one log line.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans: list[tuple[str, dict, float, float, str | None]] = []  # name, labels, offset, seconds, error
+
+    @contextlib.contextmanager
+    def activate(self) -> Iterator["Trace"]:
+        """Make this the current trace for the block. The block must not span a `yield` of an
+        async generator, whose next step may run in another context."""
+        token = _current_trace.set(self)
+        try:
+            yield self
+        finally:
+            _current_trace.reset(token)
+
+    def add(self, name: str, labels: dict, start: float, seconds: float, error: str | None) -> None:
+        self.spans.append((name, labels, start - self.started, seconds, error))
+
+    def summary(self) -> str:
+        total = time.perf_counter() - self.started
+        parts = []
+        for name, labels, offset, seconds, error in self.spans:
+            label = ','.join(str(v) for v in labels.values())
+            parts.append(
+                f"{name}{f'[{label}]' if label else ''} +{offset:.3f}s {seconds:.3f}s{f' {error}' if error else ''}"
+            )
+        return f"{self.name} {total:.3f}s: {' | '.join(parts)}"
+
+
+def current_trace() -> Trace | None:
+    return _current_trace.get()
+
+
+def record(name: str, seconds: float, error: str | None = None, trace: Trace | None = None, **labels) -> None:
+    """Record a phase measured by hand, e.g. one that spans the chunks of a stream."""
+    labels = {key: str(value) for key, value in labels.items()}
+    metrics.observe(name, seconds, labels, error)
+    trace = trace or current_trace()
+    if trace is not None:
+        trace.add(name, labels, time.perf_counter() - seconds, seconds, error)
+    logger.debug(f'span {name} {labels} {seconds:.4f}s{f" error={error}" if error else ""}')
+
+
+@contextlib.contextmanager
+def span(name: str, trace: Trace | None = None, **labels) -> Iterator[dict]:
+    """Time the block as span `name`. An exception marks the span failed with its type name;
+    the block can also set `['error']` on the yielded dict, e.g. for an HTTP error status."""
+    start = time.perf_counter()
+    state = {'error': None}
+    try:
+        yield state
+    except BaseException as e:
+        state['error'] = type(e).__name__
+        raise
+    finally:
+        record(name, time.perf_counter() - start, state['error'], trace, **labels)
@@ -1,50 +1,217 @@
+import asyncio
+import contextlib
+import dataclasses
 import functools
 import json
-from typing import Any
+import re
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
 from fastmcp import Client
+import httpx
 import logging
 import openai
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
 import os
 import tomllib
 from src.strict_schema import ensure_strict_json_schema
+from src.tracing import Trace, metrics, record, span
+from src.prompt_cache import layout_messages, supports_cache_control, usage_summary
 from src.tools import FunctionTool
 from openai.types.chat.chat_completion_tool_param import ChatCompletionToolParam
 logger = logging.getLogger("openai.agents")
 
 def tool_to_openai(tool: FunctionTool) -> ChatCompletionToolParam:
     if isinstance(tool, FunctionTool):
-        pram = tool.params_json_schema
-        additionalProperties = pram['additionalProperties']
-        pram.pop('additionalProperties')
+        # shallow copy: params_json_schema may be a shared, cached strict schema
+        pram = dict(tool.params_json_schema)
+        additionalProperties = pram.pop('additionalProperties', False)
         return {
             "type": "function",
             "function": {
                 "description": tool.description or "",
                 "name": tool.name,
-                "parameters": tool.params_json_schema,
+                "parameters": pram,
                 "additionalProperties": additionalProperties,
             },
         }
 
+@dataclass
+class ToolCatalog:
+    """Tools of one MCP server, converted once and reused for every chat turn."""
+
+    function_tools: list[FunctionTool]
+    openai_tools: list[ChatCompletionToolParam]
+    loaded_at: float
+    generation: int
+
+
+def server_key(server: Client) -> str:
+    """Stable identifier of an MCP server connection (pool name or transport)."""
+    return getattr(server, 'name', None) or repr(server.transport)
+
+
+class ToolCatalogCache:
+    """Caches the converted tool catalog per MCP server.
+
+    A catalog is listed and converted (`to_function_tool`, `ensure_strict_json_schema`,
+    `tool_to_openai`) once, then served from memory until the server sends
+    `notifications/tools/list_changed` or the entry is older than `ttl` seconds
+    (`ttl=None` or `0` keeps it until a notification arrives).
+    """
+
+    def __init__(self, ttl: float | None = None):
+        self.ttl = ttl
+        self._entries: dict[str, ToolCatalog] = {}
+        self._generations: dict[str, int] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+
+    def watch(self, server) -> None:
+        """Invalidate the server's catalog on its tool list change notifications."""
+        key = server_key(server)
+        server.add_tools_changed_listener(lambda: self.invalidate(key))
+
+    def invalidate(self, key: str | None = None) -> None:
+        keys = [key] if key is not None else list(self._generations)
+        for k in keys:
+            self._generations[k] = self._generations.get(k, 0) + 1
+
+    def _is_fresh(self, key: str, entry: ToolCatalog | None) -> bool:
+        if entry is None or entry.generation != self._generations.get(key, 0):
+            return False
+        return not self.ttl or time.monotonic() - entry.loaded_at < self.ttl
+
+    def cached(self, key: str) -> ToolCatalog | None:
+        """Last catalog loaded for `key`, fresh or not."""
+        return self._entries.get(key)
+
+    async def get(self, server: Client, convert_schemas_to_strict: bool) -> ToolCatalog:
+        key = server_key(server)
+        entry = self._entries.get(key)
+        if self._is_fresh(key, entry):
+            return entry
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if self._is_fresh(key, entry):
+                return entry
+            generation = self._generations.get(key, 0)
+            function_tools = await get_function_tools(server, convert_schemas_to_strict)
+            entry = ToolCatalog(
+                function_tools=function_tools,
+                openai_tools=[tool_to_openai(tool) for tool in function_tools],
+                loaded_at=time.monotonic(),
+                generation=generation,
+            )
+            self._entries[key] = entry
+            logger.info(f'tool catalog loaded: {key}, {len(function_tools)} tools')
+            return entry
+
+    async def get_all(
+        self,
+        servers: list[Client],
+        convert_schemas_to_strict: bool,
+        timeout: float | None = None,
+        on_duplicate: str = 'prefix',
+    ) -> tuple[list[FunctionTool], list[ChatCompletionToolParam]]:
+        """Merged function and OpenAI tools of all servers, refreshed concurrently.
+
+        Each server gets `timeout` seconds. When it fails or times out, its last known catalog
+        is served instead; a server that never answered is dropped.
+        """
+        results = await asyncio.gather(
+            *[_with_timeout(self.get(server, convert_schemas_to_strict), timeout) for server in servers],
+            return_exceptions=True,
+        )
+        catalogs = []
+        for server, result in zip(servers, results):
+            key = server_key(server)
+            if isinstance(result, BaseException):
+                error, result = result, self.cached(key)
+                if result is None:
+                    logger.warning(f'tool discovery failed for {key}, dropped: {error!r}')
+                    continue
+                logger.warning(f'tool discovery failed for {key}, serving catalog from {time.monotonic() - result.loaded_at:.0f}s ago: {error!r}')
+            catalogs.append((key, result.function_tools, result.openai_tools))
+        return merge_tool_catalogs(catalogs, on_duplicate)
+
+def namespace_tool_name(server_name: str, tool_name: str) -> str:
+    """`<server>__<tool>`, trimmed to the 64 characters OpenAI accepts for function names."""
+    prefix = re.sub(r'[^a-zA-Z0-9_-]+', '_', server_name).strip('_')
+    return f"{prefix[:max(1, 62 - len(tool_name))]}__{tool_name}"[:64]
+
+def merge_tool_catalogs(
+    catalogs: list[tuple[str, list[FunctionTool], list[ChatCompletionToolParam] | None]],
+    on_duplicate: str = 'prefix',
+) -> tuple[list[FunctionTool], list[ChatCompletionToolParam | None]]:
+    """Merge per-server tool lists, resolving tool names that several servers share.
+
+    `catalogs` is `(server name, function tools, openai tools or None)` in server order; the
+    first server keeps the plain name so the result does not depend on which server answered
+    first. `on_duplicate` decides what happens to later tools with a taken name:
+
+    - `prefix`: expose them as `<server>__<tool>` (the MCP call still uses the original name)
+    - `skip`: drop them
+    - `error`: raise `ValueError`
+    """
+    function_tools: list[FunctionTool] = []
+    openai_tools: list[ChatCompletionToolParam | None] = []
+    owners: dict[str, str] = {}
+    for name, server_tools, server_openai_tools in catalogs:
+        if server_openai_tools is None:
+            server_openai_tools = [None] * len(server_tools)
+        for tool, openai_tool in zip(server_tools, server_openai_tools):
+            if tool.name in owners:
+                if on_duplicate == 'error':
+                    raise ValueError(
+                        f"Duplicate tool names found across MCP servers: "
+                        f"{tool.name} ({owners[tool.name]}, {name})"
+                    )
+                if on_duplicate == 'skip':
+                    logger.warning(f'duplicate tool {tool.name} from {name} skipped, kept {owners[tool.name]}')
+                    continue
+                alias = namespace_tool_name(name, tool.name)
+                if alias in owners:
+                    raise ValueError(f"Duplicate tool names found across MCP servers: {alias}")
+                logger.info(f'duplicate tool {tool.name} from {name} exposed as {alias}')
+                tool = dataclasses.replace(tool, name=alias)
+                if openai_tool is not None:
+                    openai_tool = {**openai_tool, 'function': {**openai_tool['function'], 'name': alias}}
+            owners[tool.name] = name
+            function_tools.append(tool)
+            openai_tools.append(openai_tool)
+    # sorted by name: the tool list is part of the request prefix the provider's prompt cache
+    # matches byte for byte, so it must not depend on server or listing order
+    order = sorted(range(len(function_tools)), key=lambda i: function_tools[i].name)
+    return [function_tools[i] for i in order], [openai_tools[i] for i in order]
+
+async def _with_timeout(coro, timeout: float | None):
+    async with asyncio.timeout(timeout):
+        return await coro
+
 async def get_all_function_tools(
-    servers: list[Client], convert_schemas_to_strict: bool
-) -> list[dict]:
-    """Get all function tools from a list of MCP servers."""
-    tools = []
-    tool_names: set[str] = set()
-    for server in servers:
-        server_tools = await get_function_tools(server, convert_schemas_to_strict)
-        server_tool_names = {tool.name for tool in server_tools}
-        # if len(server_tool_names & tool_names) > 0:
-        #     raise UserError(
-        #         f"Duplicate tool names found across MCP servers: "
-        #         f"{server_tool_names & tool_names}"
-        #     )
-        tool_names.update(server_tool_names)
-        tools.extend(server_tools)
-
-    return tools
+    servers: list[Client],
+    convert_schemas_to_strict: bool,
+    timeout: float | None = None,
+    on_duplicate: str = 'prefix',
+) -> list[FunctionTool]:
+    """Get all function tools from a list of MCP servers.
+
+    Servers are listed concurrently, each within `timeout` seconds. A server that fails or
+    times out contributes no tools instead of failing the whole discovery.
+    """
+    results = await asyncio.gather(
+        *[_with_timeout(get_function_tools(server, convert_schemas_to_strict), timeout) for server in servers],
+        return_exceptions=True,
+    )
+    catalogs = []
+    for server, result in zip(servers, results):
+        if isinstance(result, BaseException):
+            logger.warning(f'tool discovery failed for {server_key(server)}, dropped: {result!r}')
+            continue
+        catalogs.append((server_key(server), result, None))
+    return merge_tool_catalogs(catalogs, on_duplicate)[0]
 
 async def get_function_tools(
     server: Client, convert_schemas_to_strict: bool
@@ -62,7 +229,7 @@ def to_function_tool(
 
     # MCP spec doesn't require the inputSchema to have `properties`, but OpenAI spec does.
     if "properties" not in schema:
-        schema["properties"] = {}
+        schema = {**schema, "properties": {}}
 
     if convert_schemas_to_strict:
         try:
@@ -77,38 +244,439 @@ def to_function_tool(
         params_json_schema=schema,
         on_invoke_tool=invoke_func,
         strict_json_schema=is_strict,
+        annotations=getattr(tool, 'annotations', None),
+    )
+
+class ToolResultCache:
+    """LRU of MCP tool results keyed on server, tool name and canonicalized arguments.
+
+    Only tools whose MCP annotations mark them `readOnlyHint` or `idempotentHint` are cached
+    (`cache_unannotated=True` also caches tools without annotations), so repeating a lookup
+    with the same arguments within `ttl` seconds skips the round trip to the MCP server.
+    Results that report provider errors are not stored (see `storable`).
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 300, cache_unannotated: bool = False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_unannotated = cache_unannotated
+        self._entries: OrderedDict[tuple, tuple[float, str]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def cacheable(self, tool) -> bool:
+        annotations = getattr(tool, 'annotations', None)
+        if annotations is None:
+            return self.cache_unannotated
+        return bool(annotations.readOnlyHint or annotations.idempotentHint)
+
+    @staticmethod
+    def storable(output: str) -> bool:
+        """False for an empty result or one carrying an `errors` meta value (the Amadeus tools'
+        in-band report of a failed request), so a transient failure is not replayed for `ttl`."""
+        if not output:
+            return False
+        if output.startswith('{'):
+            try:
+                meta = json.loads(output).get('meta')
+            except (ValueError, AttributeError):
+                return True
+            return not (isinstance(meta, dict) and 'errors' in meta)
+        return re.search(r'(?:^|, )errors: ', output.rsplit('\n', 1)[-1]) is None
+
+    @staticmethod
+    def make_key(server: Client, tool_name: str, arguments: dict) -> tuple:
+        canonical = json.dumps(arguments, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+        return server_key(server), tool_name, canonical
+
+    def get(self, key: tuple) -> str | None:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key: tuple, value: str) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+_tool_result_caches: dict[tuple, ToolResultCache] = {}
+
+def get_tool_result_cache() -> ToolResultCache | None:
+    """Shared tool-result cache configured by `[mcp] tool_result_*`, or None when it is
+    disabled (the default)."""
+    mcp_config = get_config().get('mcp', {})
+    if not mcp_config.get('tool_result_cache', False):
+        return None
+    key = (
+        mcp_config.get('tool_result_max', 256),
+        mcp_config.get('tool_result_ttl', 300),
+        mcp_config.get('tool_result_cache_all', False),
     )
+    cache = _tool_result_caches.get(key)
+    if cache is None:
+        cache = _tool_result_caches[key] = ToolResultCache(*key)
+    return cache
 
 async def invoke_mcp_tool(
     server: Client, tool: dict, input_json: str
 ) -> str:
-    """Invoke an MCP tool and return the result as a string."""
+    """Invoke an MCP tool and return the result as a string.
+
+    With the tool-result cache enabled, read-only/idempotent tools called again with the
+    same arguments are answered from the cache, unless the call asks for `refresh`.
+    """
     try:
         json_data: dict[str, Any] = json.loads(input_json) if input_json else {}
     except Exception as e:
         logger.error('input data error', e)
+    cache = get_tool_result_cache()
+    cache_key = None
+    if cache is not None and cache.cacheable(tool) and not json_data.get('refresh'):
+        cache_key = cache.make_key(server, tool.name, json_data)
+        cached = cache.get(cache_key)
+        if cached is not None:
+            logger.info(f'tool result cache hit: {tool.name}')
+            return cached
     try:
         result = await server.call_tool(tool.name, json_data)
     except Exception as e:
         logger.error(f"Error invoking MCP tool {tool.name}: {e}")
-        # raise AgentsException(f"Error invoking MCP tool {tool.name}: {e}") from e
+        # e.g. the server's scheduler refusing an overloaded tool; `invoke_tool_call` reports
+        # the message to the model
+        raise
 
     # The MCP tool result is a list of content items, whereas OpenAI tool outputs are a single
     # string. We'll try to convert.
     
     tool_output = result[0].text # just for text
+    if cache_key is not None and cache.storable(tool_output):
+        cache.set(cache_key, tool_output)
     return tool_output
 
-def get_client():
-    config = get_config()    
+class ToolCallAccumulator:
+    """Rebuilds every tool call of a streamed completion from its `delta.tool_calls` fragments.
+
+    Fragments are matched by their `index`, so parallel tool calls (e.g. a flight search and
+    a hotel lookup in the same turn) are all kept instead of being merged into one.
+    """
+
+    def __init__(self):
+        self._calls: dict[int, dict] = {}
+
+    def add(self, delta_tool_calls) -> None:
+        for tool_call in delta_tool_calls:
+            index = tool_call.index if tool_call.index is not None else max(self._calls, default=0)
+            call = self._calls.setdefault(
+                index, {'id': '', 'type': 'function', 'function': {'name': '', 'arguments': ''}}
+            )
+            if tool_call.id:
+                call['id'] = tool_call.id
+            if tool_call.function:
+                if tool_call.function.name:
+                    call['function']['name'] = tool_call.function.name
+                if tool_call.function.arguments:
+                    call['function']['arguments'] += tool_call.function.arguments
+
+    @property
+    def calls(self) -> list[dict]:
+        """Complete tool calls in index order, shaped for an assistant `tool_calls` message."""
+        return [self._calls[index] for index in sorted(self._calls) if self._calls[index]['function']['name']]
+
+    def __bool__(self) -> bool:
+        return bool(self.calls)
+
+async def invoke_tool_call(
+    tool_call: dict, tools: list[FunctionTool], timeout: float | None = None
+) -> dict:
+    """Run one tool call and return its `tool` message. Errors are reported to the model as content."""
+    function_name = tool_call['function']['name']
+    tool = next((t for t in tools if t.name == function_name), None)
+    if tool is None:
+        tool_result = f'Unknown tool: {function_name}'
+    else:
+        with span('tool', tool=function_name) as state:
+            try:
+                async with asyncio.timeout(timeout):
+                    tool_result = await tool.on_invoke_tool(tool_call['function']['arguments'])
+                logger.info(f'tool result: {function_name}, {tool_result}')
+            except TimeoutError:
+                logger.error(f'tool {function_name} timed out after {timeout}s')
+                tool_result = f'Tool {function_name} timed out after {timeout}s'
+                state['error'] = 'TimeoutError'
+            except Exception as e:
+                logger.error(f'tool {function_name} failed: {e!r}')
+                tool_result = f'Tool {function_name} failed: {e}'
+                state['error'] = type(e).__name__
+    return {
+        'role': 'tool',
+        'name': function_name,
+        'tool_call_id': tool_call['id'],
+        'content': json.dumps(tool_result, ensure_ascii=False),
+    }
+
+async def invoke_tool_calls(
+    tool_calls: list[dict], tools: list[FunctionTool], timeout: float | None = None
+) -> list[dict]:
+    """Run all tool calls of a turn concurrently; `tool` messages come back in call order."""
+    return list(await asyncio.gather(*[invoke_tool_call(tc, tools, timeout) for tc in tool_calls]))
+
+class JsonCompletionScanner:
+    """Tells when streamed text has formed one complete top-level JSON object or array.
+
+    Only newly fed text is scanned (strings and escapes are tracked), so following a stream
+    of argument fragments costs O(length) in total instead of a `json.loads` per fragment.
+    """
+
+    def __init__(self):
+        self.scanned = 0        # characters fed so far
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.closed = False     # the top-level value has been closed
+        self.trailing = False   # non-whitespace followed it, so the text is not one value
+
+    @property
+    def complete(self) -> bool:
+        return self.closed and not self.trailing
+
+    def feed(self, text: str) -> bool:
+        self.scanned += len(text)
+        for char in text:
+            if self.closed:
+                if not char.isspace():
+                    self.trailing = True
+                    break
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in '{[':
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                self.closed = self.depth == 0
+        return self.complete
+
+class SpeculativeToolCalls(ToolCallAccumulator):
+    """`ToolCallAccumulator` that starts each tool call while the completion is still streaming.
+
+    A call is dispatched as soon as its arguments form a complete JSON object, so the tool
+    round trip overlaps with the model streaming the rest of the completion (further parallel
+    calls, the finish chunk, usage). `results()` then waits for the running calls and runs the
+    ones that could not be started early, returning `tool` messages in call order like
+    `invoke_tool_calls`.
+
+    `mode` (`[mcp] tool_speculation`) limits which tools are started early: `safe` only those
+    annotated `readOnlyHint` or `idempotentHint`, since a call started early has run even if
+    the stream later fails; `all` any tool; `off` none. A speculative call whose arguments
+    changed afterwards is cancelled and run again with the final ones.
+    """
+
+    def __init__(
+        self, tools: list[FunctionTool], timeout: float | None = None, mode: str = 'safe', trace: Trace | None = None
+    ):
+        super().__init__()
+        self.tools = tools
+        self.timeout = timeout
+        self.mode = mode
+        self.trace = trace
+        self._scanners: dict[int, JsonCompletionScanner] = {}
+        self._started: dict[int, tuple[str, asyncio.Task]] = {}  # index -> (arguments, task)
+
+    def _speculable(self, name: str) -> bool:
+        if self.mode == 'all':
+            return any(t.name == name for t in self.tools)
+        if self.mode != 'safe':
+            return False
+        tool = next((t for t in self.tools if t.name == name), None)
+        annotations = getattr(tool, 'annotations', None)
+        return annotations is not None and bool(annotations.readOnlyHint or annotations.idempotentHint)
+
+    def add(self, delta_tool_calls) -> None:
+        super().add(delta_tool_calls)
+        for index, call in self._calls.items():
+            arguments = call['function']['arguments']
+            scanner = self._scanners.setdefault(index, JsonCompletionScanner())
+            if scanner.scanned == len(arguments):
+                continue
+            if not scanner.feed(arguments[scanner.scanned:]) or index in self._started:
+                continue
+            if not call['id'] or not self._speculable(call['function']['name']):
+                continue
+            try:
+                if not isinstance(json.loads(arguments), dict):
+                    continue
+            except json.JSONDecodeError:
+                continue
+            snapshot = {**call, 'function': dict(call['function'])}
+            # the task copies the current context, so its spans land in the turn's trace
+            with (self.trace.activate() if self.trace is not None else contextlib.nullcontext()):
+                task = asyncio.create_task(invoke_tool_call(snapshot, self.tools, self.timeout))
+            self._started[index] = (arguments, task)
+            metrics.increment('tool_speculation_total', tool=call['function']['name'], result='started')
+            logger.info(f"speculative tool call: {call['function']['name']} {arguments}")
+
+    async def results(self) -> list[dict]:
+        async def result(index: int, call: dict) -> dict:
+            started = self._started.get(index)
+            if started is not None:
+                arguments, task = started
+                if arguments == call['function']['arguments']:
+                    return await task
+                task.cancel()
+                metrics.increment('tool_speculation_total', tool=call['function']['name'], result='discarded')
+                logger.warning(f"speculative tool call {call['function']['name']} discarded, its arguments changed")
+            return await invoke_tool_call(call, self.tools, self.timeout)
+
+        return list(await asyncio.gather(*[
+            result(index, self._calls[index]) for index in sorted(self._calls) if self._calls[index]['function']['name']
+        ]))
+
+    def cancel(self) -> None:
+        """Cancel calls still running, e.g. when the turn ends without `results()`."""
+        for _, task in self._started.values():
+            task.cancel()
+
+_clients: dict[tuple, OpenAI | AsyncOpenAI] = {}
+_client_leases: Counter[AsyncOpenAI] = Counter()  # turns using each async client (`llm_client`)
+_retired_clients: list[AsyncOpenAI] = []  # superseded, closed once their last lease ends
+
+def _http_limits(config: dict) -> tuple[httpx.Limits, httpx.Timeout]:
+    http = config.get('llm_http', {})
+    limits = httpx.Limits(
+        max_connections=http.get('max_connections', 100),
+        max_keepalive_connections=http.get('max_keepalive_connections', 20),
+        keepalive_expiry=http.get('keepalive_expiry', 60),
+    )
+    timeout = httpx.Timeout(http.get('timeout', 600), connect=http.get('connect_timeout', 5))
+    return limits, timeout
+
+def _shared_client(client_cls, http_client_cls):
+    """One client per (class, base URL, API key), reused so its HTTP connection pool and TLS
+    sessions survive across requests. A changed config.toml yields a new client, which
+    supersedes the previous one of the same class: an async one is closed once no
+    `llm_client` turn uses it any more, a sync one is dropped for the garbage collector."""
+    config = get_config()
     base_url = config["openai_base_url"]
     api_key = config["openai_api_key"]
-    client = OpenAI(
-        base_url = base_url,
-        api_key = api_key
-    )
+    key = (client_cls, base_url, api_key)
+    client = _clients.get(key)
+    if client is None:
+        for old_key in [k for k in _clients if k[0] is client_cls]:
+            old = _clients.pop(old_key)
+            if isinstance(old, AsyncOpenAI):
+                _retired_clients.append(old)
+        limits, timeout = _http_limits(config)
+        client = client_cls(
+            base_url = base_url,
+            api_key = api_key,
+            http_client = http_client_cls(limits=limits, timeout=timeout),
+        )
+        _clients[key] = client
     return client
 
+def get_client() -> OpenAI:
+    return _shared_client(OpenAI, openai.DefaultHttpxClient)
+
+def get_async_client() -> AsyncOpenAI:
+    """Shared async client. Like any httpx.AsyncClient it must be used from a single event loop."""
+    return _shared_client(AsyncOpenAI, openai.DefaultAsyncHttpxClient)
+
+@contextlib.asynccontextmanager
+async def llm_client() -> AsyncIterator[AsyncOpenAI]:
+    """`get_async_client()` held for one chat turn. When the turn ends, clients superseded by a
+    config.toml change and no longer used by any turn are closed."""
+    client = get_async_client()
+    _client_leases[client] += 1
+    try:
+        yield client
+    finally:
+        _client_leases[client] -= 1
+        if _client_leases[client] <= 0:
+            del _client_leases[client]
+        for old in [c for c in _retired_clients if c not in _client_leases]:
+            _retired_clients.remove(old)
+            await old.close()
+
+async def async_llm_streaming_call(
+        client: AsyncOpenAI,
+        system_prompt:str = '',
+        messages:list[dict] = [],
+        tools: list = [],
+        temperature:float = 0.3,
+        trace: Trace | None = None,
+        tool_choice: str | None = None,
+        ):
+    """Same as `llm_streaming_call`, but awaits every chunk so the event loop keeps serving
+    other chats (and the MCP sessions) while the model streams.
+
+    The request is laid out for prompt caching (`layout_messages`): a static system prompt
+    and the history as sent before, with cache breakpoints where the model supports them
+    (`[prompt_cache]` in config.toml). Volatile values such as the current time go on the
+    user message with `pin_context` before it is first sent.
+
+    Records `llm.ttft` (request to first chunk) and `llm.stream` (request to last chunk);
+    pass `trace` to add them to a turn's trace. With `include_usage`, the prompt, cached and
+    completion token counts are logged and counted in `llm_tokens_total`; the usage-only
+    chunk is not yielded.
+    """
+    config = get_config()
+    model = config['base_ml']
+    prompt_cache = config.get('prompt_cache', {})
+    cache_control = supports_cache_control(model, prompt_cache.get('cache_control', 'auto'))
+    messages = layout_messages(system_prompt, messages, cache_control)
+    include_usage = prompt_cache.get('include_usage', True)
+    start = time.perf_counter()
+    first_chunk, error = True, None
+    try:
+        response = await client.chat.completions.create(
+            model = model,
+            messages = messages,
+            temperature = temperature,
+            tools=tools if tools else openai.NOT_GIVEN,
+            tool_choice=tool_choice if tools and tool_choice else openai.NOT_GIVEN,
+            max_tokens=4096,
+            stream=True,
+            stream_options={'include_usage': True} if include_usage else openai.NOT_GIVEN,
+        )
+        async for chunk in response:
+            if first_chunk:
+                first_chunk = False
+                record('llm.ttft', time.perf_counter() - start, trace=trace, model=model)
+            if getattr(chunk, 'usage', None):
+                usage = usage_summary(chunk.usage)
+                logger.info(f'llm usage: {usage}')
+                for kind, count in usage.items():
+                    metrics.increment('llm_tokens_total', count, model=model, kind=kind)
+            if not chunk.choices:
+                continue
+            yield chunk
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record('llm.stream', time.perf_counter() - start, error, trace, model=model)
+
 def llm_streaming_call(
         client: OpenAI,
         system_prompt:str = '', 
@@ -135,10 +703,7 @@ def streaming_call(
         tools: list = [],
     ):
     config = get_config()
-    chat_client = openai.OpenAI(
-        base_url=config['openai_base_url'],
-        api_key=config['openai_api_key'],
-    )
+    chat_client = get_client()
     response = chat_client.chat.completions.create(
         model=config['base_ml'],
         messages=[{'role': 'user', 'content': message}],
@@ -157,10 +722,7 @@ def llm_call(
         temperature:float, 
     ) -> str:
     config = get_config()
-    client = OpenAI(
-        base_url=config['openai_base_url'],
-        api_key=config['openai_api_key'],
-    )
+    client = get_client()
     if system_prompt:
         messages = [{'role': 'system', 'content': system_prompt}] + messages
         
@@ -171,13 +733,30 @@ def llm_call(
     )
     return response.choices[0].message.content
 
-def get_config(path="config.toml") -> dict:
+_config_cache: dict[str, tuple[int, float, dict]] = {}
+CONFIG_RELOAD_CHECK_INTERVAL = 1.0  # seconds between mtime checks of config.toml
+
+def get_config(path=None) -> dict:
+    """Parsed config.toml (or the file named by the `MCP_TEST_CONFIG` environment variable).
+    The file is parsed once and re-parsed only when its mtime changes, which is checked at
+    most every `CONFIG_RELOAD_CHECK_INTERVAL` seconds."""
+    path = path or os.environ.get('MCP_TEST_CONFIG', 'config.toml')
+    now = time.monotonic()
+    cached = _config_cache.get(path)
+    if cached is not None and now - cached[1] < CONFIG_RELOAD_CHECK_INTERVAL:
+        return cached[2]
+    mtime = os.stat(path).st_mtime_ns
+    if cached is not None and cached[0] == mtime:
+        _config_cache[path] = (mtime, now, cached[2])
+        return cached[2]
+
     with open(path, "rb") as f:
         config = tomllib.load(f)
-    print(config.keys())
+    logger.info(f'config loaded: {path}, {list(config.keys())}')
     
     if '$' in config["openai_base_url"]:
         config["openai_base_url"] = os.path.expandvars(config["openai_base_url"])
     if '$' in config["openai_api_key"]:
         config["openai_api_key"] = os.path.expandvars(config["openai_api_key"])
-    return config
\ No newline at end of file
+    _config_cache[path] = (mtime, now, config)
+    return config